@@ -0,0 +1,95 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from database import create_analysis_job, claim_analysis_job, touch_analysis_job, update_analysis_job, get_pending_analysis_jobs
+from precompute import message_watermark
+
+
+def has_upstream_error(result) -> bool:
+    """Erkennt Ergebnisse, bei denen mindestens ein Modellaufruf fehlgeschlagen ist"""
+    if result is None:
+        return True
+    if isinstance(result, dict):
+        if 'error' in result:
+            return True
+        return any(has_upstream_error(value) for key, value in result.items()
+                   if key not in ('followup_questions',))
+    return False
+
+
+class AnalysisJobQueue:
+    """Führt Analyse-Jobs in einem Worker-Pool aus und speichert die Ergebnisse in SQLite"""
+
+    def __init__(self, handlers: Dict[str, Callable[[List[Dict]], Dict]], max_workers: int = 2,
+                 max_retries: int = 2, retry_delay: float = 2.0,
+                 on_complete: Optional[Callable[[int, str], None]] = None):
+        self.handlers = handlers
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_complete = on_complete
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Erst bei Bedarf erzeugen, damit keine Threads vor einem Fork entstehen
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analysis-job')
+        return self._executor
+
+    def submit(self, session_id: int, kind: str, messages: List[Dict]) -> int:
+        """Plant einen Job ein; identische Anfragen für denselben Stand teilen sich einen Job"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unbekannter Job-Typ: {kind}")
+        job_id, created = create_analysis_job(session_id, kind, message_watermark(messages), messages)
+        if created:
+            self.executor.submit(self._run, job_id)
+        return job_id
+
+    def resume_pending(self):
+        """Nimmt wartende Jobs und Jobs abgestürzter Worker (abgelaufene Lease) wieder auf"""
+        for job_id in get_pending_analysis_jobs():
+            self.executor.submit(self._run, job_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _run(self, job_id: int):
+        job = claim_analysis_job(job_id)
+        if job is None:
+            # Bereits von einem anderen Worker übernommen
+            return
+        kind, messages = job
+
+        result = None
+        attempts = 0
+        while attempts <= self.max_retries:
+            attempts += 1
+            if attempts > 1:
+                # Lease vor jedem weiteren Versuch verlängern
+                touch_analysis_job(job_id)
+            try:
+                result = self.handlers[kind](messages)
+            except Exception as e:
+                result = None
+                error = str(e)
+            else:
+                if not has_upstream_error(result):
+                    break
+                error = 'Unvollständiges Ergebnis vom Modell'
+            if attempts <= self.max_retries:
+                time.sleep(self.retry_delay * attempts)
+
+        if result is not None:
+            # Teilergebnisse nach allen Versuchen trotzdem ausliefern
+            status = 'done'
+            update_analysis_job(job_id, status, attempts, result=result,
+                                error=None if not has_upstream_error(result) else error)
+        else:
+            status = 'failed'
+            update_analysis_job(job_id, status, attempts, error=error)
+
+        if self.on_complete:
+            self.on_complete(job_id, status)
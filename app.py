@@ -1,32 +1,183 @@
-from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_file
+from flask import Flask, Blueprint, render_template, request, jsonify, Response, stream_with_context, send_file
 from flask_socketio import SocketIO
 import requests
 import json
 import os
+import time
 from dotenv import load_dotenv
-from database import init_db, create_session, get_sessions, get_session_messages, add_message, update_session_theme, export_session, delete_session
-from prompt_optimizer import PromptOptimizer
-import tempfile
 
+# Vor den übrigen Modulen laden, da diese ihre Konfiguration beim Import lesen
 load_dotenv()
 
-app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
+from database import init_db, create_session, get_sessions, get_session_messages, add_message, update_session_theme, export_session, delete_session, get_compression_stats, get_analysis_job, set_message_sent_content, get_sent_contents, get_setting, save_setting
+from prompt_optimizer import PromptOptimizer
+from prompt_cache import SimilarPromptCache
+from precompute import AnalysisPrecomputer
+from analysis_jobs import AnalysisJobQueue
+from profiling import RequestProfiler, span, event
+from context_window import ContextWindow
+import tempfile
+
+bp = Blueprint('chat', __name__)
+socketio = SocketIO(cors_allowed_origins="*")
 
 # LMStudio API Konfiguration
 LMSTUDIO_API_URL = "http://localhost:1234/v1/chat/completions"
 
-# Initialisiere die Datenbank und Optimizer
-init_db()
-optimizer = PromptOptimizer()
+# Analysemodus: 'combined' erzeugt Zusammenfassung und Visualisierungen in einem einzigen Aufruf
+ANALYSIS_MODE = os.getenv('ANALYSIS_MODE', 'separate')
+
+# Spekulative Vorberechnung der Analyse nach jeder Antwort (opt-in)
+PRECOMPUTE_ANALYSIS = os.getenv('PRECOMPUTE_ANALYSIS', 'false').lower() in ('1', 'true', 'yes')
+
+# Maximale Parallelität für die Batch-Prompt-Verbesserung
+IMPROVE_BATCH_PARALLELISM = int(os.getenv('IMPROVE_BATCH_PARALLELISM', '4'))
+
+# Worker und Wiederholungsversuche für asynchrone Analyse-Jobs
+ANALYSIS_JOB_WORKERS = int(os.getenv('ANALYSIS_JOB_WORKERS', '2'))
+ANALYSIS_JOB_RETRIES = int(os.getenv('ANALYSIS_JOB_RETRIES', '2'))
+# Socket.IO-Benachrichtigung über abgeschlossene Jobs. Flask-SocketIO funktioniert nur mit
+# einem einzigen Worker-Prozess; bei mehreren Workern (serve.py) wird sie abgeschaltet und
+# Clients verwenden SSE (/api/jobs/<id>/events) oder Polling.
+SOCKETIO_NOTIFICATIONS = os.getenv('SOCKETIO_NOTIFICATIONS', 'true').lower() in ('1', 'true', 'yes')
+
+# Maximale Dauer eines SSE-Abonnements auf einen Job in Sekunden
+ANALYSIS_JOB_EVENTS_TIMEOUT = int(os.getenv('ANALYSIS_JOB_EVENTS_TIMEOUT', '600'))
+
+# Cache für nahezu identische Prompts: 'off', 'on' oder 'audit' (Treffer nur protokollieren)
+PROMPT_CACHE_MODE = os.getenv('PROMPT_CACHE_MODE', 'off')
+PROMPT_CACHE_THRESHOLD = float(os.getenv('PROMPT_CACHE_THRESHOLD', '0.9'))
+# Im Chat ersetzt der optimierte Prompt die Nutzernachricht; dort standardmäßig nur Audit
+PROMPT_CACHE_CHAT_MODE = os.getenv('PROMPT_CACHE_CHAT_MODE', 'audit')
+
+# Request-Profiling: Sampling-Rate (0-1), Schwelle für langsame Requests und Sampling-Profiler;
+# über /api/profiling geänderte Werte liegen in der Datenbank und gelten für alle Worker
+profiler = RequestProfiler(
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+    slow_ms=float(os.getenv('SLOW_REQUEST_MS', '5000')),
+    sampler=os.getenv('PROFILE_SAMPLER', 'false').lower() in ('1', 'true', 'yes'),
+    load_settings=lambda: get_setting('profiling'),
+    save_settings=lambda settings: save_setting('profiling', settings)
+)
+
+# Token-Budget für den an das Modell gesendeten Chatverlauf (0 = unbegrenzt)
+context_window = ContextWindow(
+    budget=int(os.getenv('CHAT_CONTEXT_BUDGET', '6000')),
+    chunk_size=int(os.getenv('CHAT_CONTEXT_CHUNK', '8'))
+)
+
+# Werden in create_app() initialisiert
+optimizer = None
+precomputer = None
+job_queue = None
+
+def notify_job_complete(job_id, status):
+    socketio.emit('analysis_job', {'job_id': job_id, 'status': status})
 
-def generate_streaming_response(messages):
+def create_app():
+    """Erstellt die Flask-Anwendung und initialisiert Datenbank und Optimizer"""
+    global optimizer, precomputer, job_queue
+    
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    socketio.init_app(app)
+    profiler.init_app(app)
+    
+    # Initialisiere die Datenbank und Optimizer
+    init_db()
+    if optimizer is None:
+        prompt_cache = None
+        if PROMPT_CACHE_MODE in ('on', 'audit'):
+            prompt_cache = SimilarPromptCache(threshold=PROMPT_CACHE_THRESHOLD, audit=PROMPT_CACHE_MODE == 'audit')
+        optimizer = PromptOptimizer(prompt_cache=prompt_cache)
+    if PRECOMPUTE_ANALYSIS and precomputer is None:
+        precomputer = AnalysisPrecomputer(
+            lambda messages, check_cancelled: build_analysis(messages, check_cancelled=check_cancelled)
+        )
+    if job_queue is None:
+        job_queue = AnalysisJobQueue(
+            {
+                'analyze': build_analysis,
+                'flow': optimizer.generate_conversation_flow,
+                'graph': optimizer.generate_knowledge_graph,
+                'topics': optimizer.generate_topic_evolution,
+                'sentiment': optimizer.generate_sentiment_timeline
+            },
+            max_workers=ANALYSIS_JOB_WORKERS,
+            max_retries=ANALYSIS_JOB_RETRIES,
+            on_complete=notify_job_complete if SOCKETIO_NOTIFICATIONS else None
+        )
+    
+    return app
+
+def build_analysis(messages, mode=None, check_cancelled=lambda: None):
+    """Erstellt Analyse, Folgefragen, Zusammenfassung und Visualisierungen"""
+    # Analysiere den Konversationskontext
+    analysis = optimizer.analyze_context(messages)
+    check_cancelled()
+    
+    # Generiere Folgefragen basierend auf der letzten Antwort
+    if messages and messages[-1]['role'] == 'assistant':
+        followup_questions = optimizer.suggest_followup_questions(messages[-1]['content'])
+    else:
+        followup_questions = []
+    check_cancelled()
+    
+    if (mode or ANALYSIS_MODE) == 'combined':
+        # Zusammenfassung und Visualisierungen in einem einzigen Aufruf
+        combined = optimizer.generate_combined_analysis(messages, include_summary=True)
+        return {
+            'analysis': analysis,
+            'followup_questions': followup_questions,
+            'summary': combined['summary'],
+            'visualizations': combined['visualizations']
+        }
+    
+    # Erstelle eine Zusammenfassung
+    summary = optimizer.summarize_conversation(messages)
+    check_cancelled()
+    
+    # Generate visualizations
+    conversation_flow = optimizer.generate_conversation_flow(messages)
+    check_cancelled()
+    knowledge_graph = optimizer.generate_knowledge_graph(messages)
+    check_cancelled()
+    topic_evolution = optimizer.generate_topic_evolution(messages)
+    check_cancelled()
+    sentiment_timeline = optimizer.generate_sentiment_timeline(messages)
+    
+    return {
+        'analysis': analysis,
+        'followup_questions': followup_questions,
+        'summary': summary,
+        'visualizations': {
+            'conversation_flow': conversation_flow,
+            'knowledge_graph': knowledge_graph,
+            'topic_evolution': topic_evolution,
+            'sentiment_timeline': sentiment_timeline
+        }
+    }
+
+def generate_streaming_response(messages, session_id=None, message_id=None):
     try:
+        # Originalverlauf für die Vorberechnung sichern
+        history = [dict(msg) for msg in messages]
+        response_text = ''
+        
         # Optimiere den letzten Prompt
         last_message = messages[-1]['content']
-        optimized_prompt = optimizer.optimize_prompt(last_message)
+        optimized_prompt = optimizer.optimize_prompt(last_message, cache_audit=PROMPT_CACHE_CHAT_MODE != 'on')
         messages[-1]['content'] = optimized_prompt
         
+        # Gesendete Fassung speichern, damit spätere Runden (auch in anderen Workern) denselben Präfix senden
+        if message_id and optimized_prompt != last_message:
+            set_message_sent_content(message_id, optimized_prompt)
+        sent_contents = get_sent_contents(session_id) if session_id else []
+        
+        # Verlauf auf das Token-Budget begrenzen, Präfix stabil halten
+        with span('context_window.fit'):
+            messages = context_window.fit(messages, sent_contents)
+        
         payload = {
             "messages": messages,
             "temperature": 0.7,
@@ -39,16 +190,21 @@ def generate_streaming_response(messages):
             "Accept": "text/event-stream"
         }
         
-        response = requests.post(LMSTUDIO_API_URL, 
-                               json=payload, 
-                               headers=headers, 
-                               stream=True)
+        with span('upstream.connect'):
+            response = requests.post(LMSTUDIO_API_URL, 
+                                   json=payload, 
+                                   headers=headers, 
+                                   stream=True)
         
         if response.status_code != 200:
             yield f"data: {json.dumps({'error': 'API-Fehler: ' + str(response.status_code)})}\n\n"
             return
 
+        first_byte = True
         for line in response.iter_lines():
+            if first_byte:
+                event('upstream.first_byte')
+                first_byte = False
             if line:
                 line = line.decode('utf-8')
                 if line.startswith('data: '):
@@ -57,43 +213,51 @@ def generate_streaming_response(messages):
                         if data.get('choices') and len(data['choices']) > 0:
                             content = data['choices'][0].get('delta', {}).get('content', '')
                             if content:
+                                response_text += content
                                 yield f"data: {json.dumps({'content': content})}\n\n"
                     except json.JSONDecodeError:
                         continue
                     except Exception as e:
                         yield f"data: {json.dumps({'error': str(e)})}\n\n"
-                        break
+                        return
+        event('upstream.last_byte')
+        
+        # Antwort vollständig: Folgefragen und Analyse im Hintergrund vorbereiten
+        if precomputer and session_id and response_text:
+            precomputer.schedule(session_id, history + [{'role': 'assistant', 'content': response_text}])
 
     except Exception as e:
         yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
-@app.route('/')
+@bp.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/api/sessions', methods=['GET'])
+@bp.route('/api/sessions', methods=['GET'])
 def list_sessions():
     sessions = get_sessions()
     return jsonify(sessions)
 
-@app.route('/api/sessions', methods=['POST'])
+@bp.route('/api/sessions', methods=['POST'])
 def new_session():
     data = request.json
     title = data.get('title', 'Neue Chat-Session')
     session_id = create_session(title)
     return jsonify({'session_id': session_id})
 
-@app.route('/api/sessions/<int:session_id>', methods=['DELETE'])
+@bp.route('/api/sessions/<int:session_id>', methods=['DELETE'])
 def remove_session(session_id):
     delete_session(session_id)
+    if precomputer:
+        precomputer.invalidate(session_id)
     return jsonify({'success': True})
 
-@app.route('/api/sessions/<int:session_id>/messages', methods=['GET'])
+@bp.route('/api/sessions/<int:session_id>/messages', methods=['GET'])
 def get_messages(session_id):
     messages = get_session_messages(session_id)
     return jsonify(messages)
 
-@app.route('/api/sessions/<int:session_id>/theme', methods=['PUT'])
+@bp.route('/api/sessions/<int:session_id>/theme', methods=['PUT'])
 def set_theme(session_id):
     data = request.json
     theme = data.get('theme')
@@ -102,7 +266,7 @@ def set_theme(session_id):
         return jsonify({'success': True})
     return jsonify({'error': 'Ungültiges Theme'}), 400
 
-@app.route('/api/sessions/<int:session_id>/export', methods=['GET'])
+@bp.route('/api/sessions/<int:session_id>/export', methods=['GET'])
 def export_chat(session_id):
     format = request.args.get('format', 'json')
     
@@ -117,86 +281,149 @@ def export_chat(session_id):
     
     return jsonify({'error': 'Export fehlgeschlagen'}), 400
 
-@app.route('/api/chat/stream', methods=['POST'])
+@bp.route('/api/stats/compression', methods=['GET'])
+def compression_stats():
+    return jsonify(get_compression_stats())
+
+@bp.route('/api/stats/prompt-cache', methods=['GET'])
+def prompt_cache_stats():
+    if not optimizer.prompt_cache:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **optimizer.prompt_cache.get_stats()})
+
+@bp.route('/api/profiling', methods=['GET'])
+def profiling_settings():
+    return jsonify(profiler.get_settings())
+
+@bp.route('/api/profiling', methods=['PUT'])
+def update_profiling_settings():
+    try:
+        profiler.update_settings(request.json or {})
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Ungültige Profiling-Einstellungen'}), 400
+    return jsonify(profiler.get_settings())
+
+@bp.route('/api/profiling/traces', methods=['GET'])
+def profiling_traces():
+    # Traces liegen nur im Speicher des Workers, der die Anfrage beantwortet (siehe worker_pid)
+    return jsonify({'worker_pid': os.getpid(), 'traces': list(profiler.recent_traces)})
+
+@bp.route('/api/chat/stream', methods=['POST'])
 def chat_stream():
     data = request.json
     session_id = data.get('session_id')
     messages = data.get('messages', [])
     
+    message_id = None
     if session_id:
         # Speichere die Benutzernachricht
         last_message = messages[-1]
-        add_message(session_id, last_message['role'], last_message['content'])
+        message_id = add_message(session_id, last_message['role'], last_message['content'])
+        
+        # Neue Nachricht: vorberechnete Ergebnisse sind veraltet
+        if precomputer:
+            precomputer.invalidate(session_id)
     
     return Response(
-        stream_with_context(generate_streaming_response(messages)),
+        stream_with_context(generate_streaming_response(messages, session_id, message_id)),
         mimetype='text/event-stream'
     )
 
-@app.route('/api/analyze', methods=['POST'])
+@bp.route('/api/analyze', methods=['POST'])
 def analyze_conversation():
     data = request.json
     messages = data.get('messages', [])
+    session_id = data.get('session_id')
+    mode = data.get('mode', ANALYSIS_MODE)
     
-    # Analysiere den Konversationskontext
-    analysis = optimizer.analyze_context(messages)
-    
-    # Generiere Folgefragen basierend auf der letzten Antwort
-    if messages and messages[-1]['role'] == 'assistant':
-        followup_questions = optimizer.suggest_followup_questions(messages[-1]['content'])
-    else:
-        followup_questions = []
-    
-    # Erstelle eine Zusammenfassung
-    summary = optimizer.summarize_conversation(messages)
-    
-    # Generate visualizations
-    conversation_flow = optimizer.generate_conversation_flow(messages)
-    knowledge_graph = optimizer.generate_knowledge_graph(messages)
-    topic_evolution = optimizer.generate_topic_evolution(messages)
-    sentiment_timeline = optimizer.generate_sentiment_timeline(messages)
+    # Vorberechnetes Ergebnis verwenden, falls es zum aktuellen Verlauf passt
+    if precomputer and session_id and mode == ANALYSIS_MODE:
+        precomputed = precomputer.get(session_id, messages)
+        if precomputed:
+            return jsonify(precomputed)
     
-    return jsonify({
-        'analysis': analysis,
-        'followup_questions': followup_questions,
-        'summary': summary,
-        'visualizations': {
-            'conversation_flow': conversation_flow,
-            'knowledge_graph': knowledge_graph,
-            'topic_evolution': topic_evolution,
-            'sentiment_timeline': sentiment_timeline
-        }
-    })
+    return jsonify(build_analysis(messages, mode))
 
-@app.route('/api/visualize/flow', methods=['POST'])
+@bp.route('/api/visualize/flow', methods=['POST'])
 def visualize_flow():
     data = request.json
     messages = data.get('messages', [])
     flow = optimizer.generate_conversation_flow(messages)
     return jsonify(flow)
 
-@app.route('/api/visualize/graph', methods=['POST'])
+@bp.route('/api/visualize/graph', methods=['POST'])
 def visualize_graph():
     data = request.json
     messages = data.get('messages', [])
     graph = optimizer.generate_knowledge_graph(messages)
     return jsonify(graph)
 
-@app.route('/api/visualize/topics', methods=['POST'])
+@bp.route('/api/visualize/topics', methods=['POST'])
 def visualize_topics():
     data = request.json
     messages = data.get('messages', [])
     topics = optimizer.generate_topic_evolution(messages)
     return jsonify(topics)
 
-@app.route('/api/visualize/sentiment', methods=['POST'])
+@bp.route('/api/visualize/sentiment', methods=['POST'])
 def visualize_sentiment():
     data = request.json
     messages = data.get('messages', [])
     sentiment = optimizer.generate_sentiment_timeline(messages)
     return jsonify(sentiment)
 
-@app.route('/api/improve-prompt', methods=['POST'])
+@bp.route('/api/jobs', methods=['POST'])
+def submit_job():
+    data = request.json
+    session_id = data.get('session_id')
+    messages = data.get('messages', [])
+    kind = data.get('kind', 'analyze')
+    
+    if not session_id or not messages:
+        return jsonify({'error': 'Session und Nachrichten erforderlich'}), 400
+    if kind not in job_queue.handlers:
+        return jsonify({'error': 'Unbekannter Job-Typ'}), 400
+    
+    job_id = job_queue.submit(session_id, kind, messages)
+    return jsonify(get_analysis_job(job_id)), 202
+
+@bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_analysis_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job nicht gefunden'}), 404
+    return jsonify(job)
+
+@bp.route('/api/jobs/<int:job_id>/events', methods=['GET'])
+def job_events(job_id):
+    if not get_analysis_job(job_id):
+        return jsonify({'error': 'Job nicht gefunden'}), 404
+    
+    def generate():
+        # Statusänderungen senden, bis der Job abgeschlossen ist, gelöscht wurde oder die Frist abläuft
+        deadline = time.monotonic() + ANALYSIS_JOB_EVENTS_TIMEOUT
+        last_status = None
+        while True:
+            job = get_analysis_job(job_id)
+            if job is None:
+                yield f"data: {json.dumps({'job_id': job_id, 'error': 'Job nicht gefunden'})}\n\n"
+                return
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield f"data: {json.dumps(job)}\n\n"
+            if job['status'] in ('done', 'failed'):
+                return
+            if time.monotonic() >= deadline:
+                yield f"data: {json.dumps({'job_id': job_id, 'error': 'Zeitüberschreitung, Status per Polling abfragen'})}\n\n"
+                return
+            time.sleep(1)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream'
+    )
+
+@bp.route('/api/improve-prompt', methods=['POST'])
 def improve_prompt():
     data = request.json
     original_prompt = data.get('prompt', '')
@@ -209,5 +436,32 @@ def improve_prompt():
         'improved_prompt': improved_prompt
     })
 
+@bp.route('/api/improve-prompts', methods=['POST'])
+def improve_prompts():
+    data = request.json
+    prompts = data.get('prompts', [])
+    
+    if not isinstance(prompts, list) or not prompts or not all(isinstance(prompt, str) and prompt for prompt in prompts):
+        return jsonify({'error': 'Keine gültigen Prompts angegeben'}), 400
+    
+    try:
+        parallelism = int(data.get('parallelism', IMPROVE_BATCH_PARALLELISM))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Ungültige Parallelität'}), 400
+    parallelism = max(1, min(parallelism, IMPROVE_BATCH_PARALLELISM))
+    target_language = data.get('target_language')
+    
+    def generate():
+        # Ein JSON-Objekt pro Zeile, sobald ein Prompt fertig ist
+        for result in optimizer.optimize_prompts(prompts, parallelism, target_language):
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson'
+    )
+
 if __name__ == '__main__':
+    app = create_app()
+    job_queue.resume_pending()
     app.run(debug=True, port=5000)
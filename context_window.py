@@ -0,0 +1,91 @@
+import math
+from typing import Dict, List, Optional
+
+
+class ContextBudgetError(Exception):
+    """Wird ausgelöst, wenn bereits die Systemnachrichten das Token-Budget überschreiten"""
+
+
+class ContextWindow:
+    """Begrenzt den an das Modell gesendeten Verlauf auf ein Token-Budget.
+
+    Systemnachrichten und die letzten Nachrichten bleiben erhalten; ältere
+    Nachrichten werden in festen Blöcken ab Gesprächsbeginn verworfen. Da die
+    Blockgrenzen nicht vom Gesprächsende abhängen, bleibt der Prompt-Präfix
+    zwischen zwei Runden identisch, bis der nächste Block fällt, und der
+    KV-/Prefix-Cache des Backends kann wiederverwendet werden.
+
+    Frühere Nutzernachrichten werden dafür in der Fassung gesendet, die in
+    ihrer eigenen Runde an das Modell ging (siehe database.get_sent_contents);
+    die Zuordnung erfolgt über die Position, nicht über den Text.
+    """
+
+    def __init__(self, budget: int = 6000, chunk_size: int = 8, chars_per_token: float = 4.0,
+                 message_overhead: int = 4):
+        self.budget = budget
+        # Gerade Blockgröße, damit der Verlauf weiterhin mit einer Nutzernachricht beginnt
+        self.chunk_size = max(2, chunk_size + chunk_size % 2)
+        self.chars_per_token = chars_per_token
+        self.message_overhead = message_overhead
+
+    def estimate_tokens(self, message: Dict) -> int:
+        """Schätzt die Tokenanzahl einer Nachricht inklusive Rollen-Overhead"""
+        return math.ceil(len(message.get('content') or '') / self.chars_per_token) + self.message_overhead
+
+    def fit(self, messages: List[Dict], sent_contents: Optional[List[Optional[str]]] = None) -> List[Dict]:
+        """Liefert den Verlauf, wie er innerhalb des Budgets an das Modell geht.
+
+        sent_contents enthält die gesendeten Fassungen der Nutzernachrichten in
+        Reihenfolge (None = unverändert) und wird vom Ende her zugeordnet, da
+        der Verlauf des Clients vorne gekürzt sein kann.
+        """
+        messages = list(messages)
+        if sent_contents:
+            user_positions = [i for i, msg in enumerate(messages) if msg.get('role') == 'user']
+            for position, sent in zip(reversed(user_positions), reversed(sent_contents)):
+                if sent is not None:
+                    messages[position] = {**messages[position], 'content': sent}
+        if self.budget <= 0:
+            return messages
+
+        system_messages = [msg for msg in messages if msg.get('role') == 'system']
+        conversation = [msg for msg in messages if msg.get('role') != 'system']
+
+        fixed_tokens = sum(self.estimate_tokens(msg) for msg in system_messages)
+        tokens = [self.estimate_tokens(msg) for msg in conversation]
+        total = fixed_tokens + sum(tokens)
+
+        # Die letzte Nutzernachricht und alles danach bleiben immer erhalten
+        last_user = max((i for i, msg in enumerate(conversation) if msg.get('role') == 'user'),
+                        default=len(conversation) - 1)
+
+        # Ganze Blöcke verwerfen, bis der Verlauf passt
+        start = 0
+        while total > self.budget and start + self.chunk_size <= last_user:
+            total -= sum(tokens[start:start + self.chunk_size])
+            start += self.chunk_size
+
+        # Reicht das nicht, einzelne Nachrichten verwerfen
+        while total > self.budget and start < last_user:
+            total -= tokens[start]
+            start += 1
+
+        kept = conversation[start:]
+        if total > self.budget:
+            kept = self._truncate(kept, total - self.budget)
+        return system_messages + kept
+
+    def _truncate(self, kept: List[Dict], excess_tokens: int) -> List[Dict]:
+        # Die letzte Nutzernachricht von vorne kürzen; Fragen stehen meist am Ende
+        if not kept:
+            raise ContextBudgetError(
+                f"Systemnachrichten überschreiten das Kontextbudget von {self.budget} Tokens"
+            )
+        first = kept[0]
+        content = first.get('content') or ''
+        available = len(content) - math.ceil(excess_tokens * self.chars_per_token) - 1
+        if available <= 0:
+            raise ContextBudgetError(
+                f"Nachricht passt nicht in das Kontextbudget von {self.budget} Tokens"
+            )
+        return [{**first, 'content': '…' + content[-available:]}] + kept[1:]
@@ -1,7 +1,139 @@
 import sqlite3
 from datetime import datetime
 import json
+import os
+import time
+import zlib
 
+from dotenv import load_dotenv
+from profiling import traced
+
+# .env auch beim direkten Aufruf (python database.py compress) berücksichtigen
+load_dotenv()
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Komprimierung von Nachrichteninhalten: 'none', 'zlib' oder 'zstd'
+MESSAGE_COMPRESSION = os.getenv('MESSAGE_COMPRESSION', 'none')
+# Nur Inhalte ab dieser Größe (in Bytes) werden komprimiert
+MESSAGE_COMPRESSION_THRESHOLD = int(os.getenv('MESSAGE_COMPRESSION_THRESHOLD', '1024'))
+# Optionales, mit train_compression_dictionary() erstelltes zstd-Wörterbuch
+MESSAGE_COMPRESSION_DICT = os.getenv('MESSAGE_COMPRESSION_DICT', '')
+# Frühere Wörterbücher (durch os.pathsep getrennt), damit Nachrichten nach einem Wechsel
+# lesbar bleiben, bis compress_existing_messages() sie neu komprimiert hat
+MESSAGE_COMPRESSION_DICT_ARCHIVE = os.getenv('MESSAGE_COMPRESSION_DICT_ARCHIVE', '')
+
+# Laufende Analyse-Jobs ohne Lebenszeichen innerhalb dieser Frist (Sekunden) gelten als abgebrochen;
+# muss länger sein als ein einzelner Versuch eines Jobs
+ANALYSIS_JOB_LEASE = int(os.getenv('ANALYSIS_JOB_LEASE', '900'))
+
+# Bedingung für laufende Jobs, deren Worker abgestürzt ist
+_STALE_RUNNING = "status = 'running' AND updated_at < datetime('now', ?)"
+
+def _lease_cutoff():
+    return f'-{ANALYSIS_JOB_LEASE} seconds'
+
+# Laufzeitstatistik für das Dekomprimieren beim Lesen
+read_stats = {'decompressed': 0, 'decompress_seconds': 0.0}
+
+_zstd_dict = None
+_zstd_dicts = None
+
+def _require_zstandard(encoding):
+    if zstandard is None:
+        raise RuntimeError(f"zstandard ist nicht installiert; Nachrichten mit Encoding {encoding} sind nicht lesbar")
+
+def _get_zstd_dict():
+    global _zstd_dict
+    if _zstd_dict is None and MESSAGE_COMPRESSION_DICT and os.path.exists(MESSAGE_COMPRESSION_DICT):
+        with open(MESSAGE_COMPRESSION_DICT, 'rb') as f:
+            _zstd_dict = zstandard.ZstdCompressionDict(f.read())
+    return _zstd_dict
+
+def _get_zstd_dicts():
+    """Aktuelles und archivierte Wörterbücher, indiziert nach Wörterbuch-ID"""
+    global _zstd_dicts
+    if _zstd_dicts is None:
+        dictionaries = {}
+        for path in MESSAGE_COMPRESSION_DICT_ARCHIVE.split(os.pathsep):
+            if path and os.path.exists(path):
+                with open(path, 'rb') as f:
+                    dictionary = zstandard.ZstdCompressionDict(f.read())
+                dictionaries[dictionary.dict_id()] = dictionary
+        current = _get_zstd_dict()
+        if current is not None:
+            dictionaries[current.dict_id()] = current
+        _zstd_dicts = dictionaries
+    return _zstd_dicts
+
+def _current_dict_encoding():
+    """Encoding, das compress_content() für neue Nachrichten mit Wörterbuch verwendet"""
+    if MESSAGE_COMPRESSION != 'zstd' or zstandard is None:
+        return None
+    dictionary = _get_zstd_dict()
+    return f'zstd-dict:{dictionary.dict_id()}' if dictionary is not None else None
+
+def _read_dict_id(path):
+    """Liest die ID eines gespeicherten zstd-Wörterbuchs"""
+    with open(path, 'rb') as f:
+        return zstandard.ZstdCompressionDict(f.read()).dict_id()
+
+def compress_content(content):
+    """Komprimiert einen Nachrichteninhalt; gibt (Inhalt, Encoding) zurück"""
+    raw = content.encode('utf-8')
+    if MESSAGE_COMPRESSION == 'none' or len(raw) < MESSAGE_COMPRESSION_THRESHOLD:
+        return content, None
+    
+    if MESSAGE_COMPRESSION == 'zstd' and zstandard is not None:
+        dictionary = _get_zstd_dict()
+        if dictionary is not None:
+            compressed = zstandard.ZstdCompressor(level=10, dict_data=dictionary).compress(raw)
+            # Wörterbuch-ID mitspeichern, damit die Zeile nur mit genau diesem Wörterbuch gelesen wird
+            encoding = f'zstd-dict:{dictionary.dict_id()}'
+        else:
+            compressed = zstandard.ZstdCompressor(level=10).compress(raw)
+            encoding = 'zstd'
+    else:
+        compressed = zlib.compress(raw, 6)
+        encoding = 'zlib'
+    
+    # Nur speichern, wenn die Komprimierung tatsächlich Platz spart
+    if len(compressed) >= len(raw):
+        return content, None
+    return sqlite3.Binary(compressed), encoding
+
+def decompress_content(content, encoding):
+    """Stellt einen gespeicherten Nachrichteninhalt wieder her"""
+    if not encoding:
+        return content
+    
+    start = time.perf_counter()
+    if encoding == 'zlib':
+        raw = zlib.decompress(content)
+    elif encoding == 'zstd':
+        _require_zstandard(encoding)
+        raw = zstandard.ZstdDecompressor().decompress(content)
+    elif encoding.startswith('zstd-dict:'):
+        _require_zstandard(encoding)
+        dict_id = int(encoding.split(':', 1)[1])
+        dictionary = _get_zstd_dicts().get(dict_id)
+        if dictionary is None:
+            raise RuntimeError(
+                f"zstd-Wörterbuch {dict_id} nicht verfügbar; MESSAGE_COMPRESSION_DICT oder "
+                f"MESSAGE_COMPRESSION_DICT_ARCHIVE muss das Wörterbuch enthalten, mit dem die "
+                f"Nachricht komprimiert wurde"
+            )
+        raw = zstandard.ZstdDecompressor(dict_data=dictionary).decompress(content)
+    else:
+        raise ValueError(f"Unbekanntes Encoding: {encoding}")
+    read_stats['decompressed'] += 1
+    read_stats['decompress_seconds'] += time.perf_counter() - start
+    return raw.decode('utf-8')
+
+@traced('db.init_db')
 def init_db():
     conn = sqlite3.connect('chats.db')
     c = conn.cursor()
@@ -29,9 +161,49 @@ def init_db():
         )
     ''')
     
+    # Spalten für komprimierte Inhalte nachrüsten
+    columns = [row[1] for row in c.execute('PRAGMA table_info(messages)')]
+    if 'encoding' not in columns:
+        c.execute('ALTER TABLE messages ADD COLUMN encoding TEXT')
+    if 'raw_size' not in columns:
+        c.execute('ALTER TABLE messages ADD COLUMN raw_size INTEGER')
+    # Tatsächlich an das Modell gesendete (optimierte) Fassung einer Nutzernachricht
+    if 'sent_content' not in columns:
+        c.execute('ALTER TABLE messages ADD COLUMN sent_content TEXT')
+    
+    # Analyse-Jobs Tabelle
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER,
+            kind TEXT,
+            watermark TEXT,
+            messages TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (session_id, kind, watermark)
+        )
+    ''')
+    # Verlaufskopien abgeschlossener Jobs werden nicht mehr benötigt
+    c.execute("UPDATE analysis_jobs SET messages = NULL WHERE status IN ('done', 'failed') AND messages IS NOT NULL")
+    
+    # Zur Laufzeit geänderte Einstellungen, die für alle Worker gelten
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
     conn.commit()
     conn.close()
 
+@traced('db.create_session')
 def create_session(title="Neue Chat-Session"):
     conn = sqlite3.connect('chats.db')
     c = conn.cursor()
@@ -41,6 +213,7 @@ def create_session(title="Neue Chat-Session"):
     conn.close()
     return session_id
 
+@traced('db.get_sessions')
 def get_sessions():
     conn = sqlite3.connect('chats.db')
     c = conn.cursor()
@@ -61,30 +234,81 @@ def get_sessions():
     conn.close()
     return sessions
 
+@traced('db.get_session_messages')
 def get_session_messages(session_id):
     conn = sqlite3.connect('chats.db')
     c = conn.cursor()
-    c.execute('SELECT role, content FROM messages WHERE session_id = ? ORDER BY created_at', (session_id,))
+    c.execute('SELECT role, content, encoding FROM messages WHERE session_id = ? ORDER BY created_at', (session_id,))
     messages = [
         {
             'role': row[0],
-            'content': row[1]
+            'content': decompress_content(row[1], row[2])
         }
         for row in c.fetchall()
     ]
     conn.close()
     return messages
 
+@traced('db.add_message')
 def add_message(session_id, role, content):
     conn = sqlite3.connect('chats.db')
     c = conn.cursor()
-    c.execute('INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)',
-              (session_id, role, content))
+    stored_content, encoding = compress_content(content)
+    c.execute('INSERT INTO messages (session_id, role, content, encoding, raw_size) VALUES (?, ?, ?, ?, ?)',
+              (session_id, role, stored_content, encoding, len(content.encode('utf-8'))))
+    message_id = c.lastrowid
     c.execute('UPDATE chat_sessions SET updated_at = CURRENT_TIMESTAMP WHERE id = ?',
               (session_id,))
     conn.commit()
     conn.close()
+    return message_id
+
+@traced('db.set_message_sent_content')
+def set_message_sent_content(message_id, sent_content):
+    """Speichert die an das Modell gesendete Fassung einer Nachricht"""
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute('UPDATE messages SET sent_content = ? WHERE id = ?', (sent_content, message_id))
+    conn.commit()
+    conn.close()
+
+@traced('db.get_sent_contents')
+def get_sent_contents(session_id):
+    """Liefert die gesendeten Fassungen der Nutzernachrichten einer Session in Eingangsreihenfolge.
+
+    Nachrichten ohne Optimierung erscheinen als None, damit die Liste
+    positionsgenau zu den Nutzernachrichten des Verlaufs passt.
+    """
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute("SELECT sent_content FROM messages WHERE session_id = ? AND role = 'user' ORDER BY id",
+              (session_id,))
+    sent_contents = [row[0] for row in c.fetchall()]
+    conn.close()
+    return sent_contents
+
+@traced('db.get_setting')
+def get_setting(key):
+    """Liefert eine gespeicherte Einstellung oder None"""
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute('SELECT value FROM settings WHERE key = ?', (key,))
+    row = c.fetchone()
+    conn.close()
+    return json.loads(row[0]) if row else None
+
+@traced('db.save_setting')
+def save_setting(key, value):
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO settings (key, value) VALUES (?, ?)
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP
+    ''', (key, json.dumps(value)))
+    conn.commit()
+    conn.close()
 
+@traced('db.update_session_theme')
 def update_session_theme(session_id, theme):
     conn = sqlite3.connect('chats.db')
     c = conn.cursor()
@@ -92,6 +316,7 @@ def update_session_theme(session_id, theme):
     conn.commit()
     conn.close()
 
+@traced('db.export_session')
 def export_session(session_id, format='json'):
     conn = sqlite3.connect('chats.db')
     c = conn.cursor()
@@ -122,10 +347,271 @@ def export_session(session_id, format='json'):
         # Hier können weitere Exportformate implementiert werden
         return None
 
+@traced('db.delete_session')
 def delete_session(session_id):
     conn = sqlite3.connect('chats.db')
     c = conn.cursor()
     c.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+    c.execute('DELETE FROM analysis_jobs WHERE session_id = ?', (session_id,))
     c.execute('DELETE FROM chat_sessions WHERE id = ?', (session_id,))
     conn.commit()
-    conn.close() 
\ No newline at end of file
+    conn.close()
+
+@traced('db.compress_existing_messages')
+def compress_existing_messages(batch_size=500):
+    """Komprimiert bestehende Nachrichten in Batches.
+
+    Erfasst unkomprimierte Nachrichten und solche, deren zstd-Wörterbuch nicht
+    mehr das aktuelle ist (nach einem Wechsel von MESSAGE_COMPRESSION_DICT;
+    das alte Wörterbuch muss dafür in MESSAGE_COMPRESSION_DICT_ARCHIVE liegen).
+    """
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    last_id = 0
+    compressed = 0
+    skipped = {}
+    
+    while True:
+        c.execute('''
+            SELECT id, content, encoding FROM messages
+            WHERE id > ? AND (encoding IS NULL OR (encoding LIKE 'zstd-dict:%' AND encoding IS NOT ?))
+            ORDER BY id LIMIT ?
+        ''', (last_id, _current_dict_encoding(), batch_size))
+        rows = c.fetchall()
+        if not rows:
+            break
+        
+        for message_id, content, old_encoding in rows:
+            try:
+                content = decompress_content(content, old_encoding) or ''
+            except RuntimeError:
+                # Altes Wörterbuch nicht verfügbar: Zeile bleibt lesbar, sobald es archiviert ist
+                skipped[old_encoding] = skipped.get(old_encoding, 0) + 1
+                continue
+            stored_content, encoding = compress_content(content)
+            # Unverändert gespeicherte Inhalte nicht neu schreiben
+            if not encoding and not old_encoding:
+                continue
+            c.execute('UPDATE messages SET content = ?, encoding = ?, raw_size = ? WHERE id = ?',
+                      (stored_content, encoding, len(content.encode('utf-8')), message_id))
+            compressed += 1
+        # Pro Batch committen, damit Schreibsperren kurz bleiben
+        conn.commit()
+        last_id = rows[-1][0]
+    
+    for encoding, count in skipped.items():
+        print(f"{count} Nachrichten mit {encoding} übersprungen: Wörterbuch fehlt in MESSAGE_COMPRESSION_DICT_ARCHIVE")
+    conn.close()
+    return compressed
+
+@traced('db.get_compression_stats')
+def get_compression_stats():
+    """Liefert gesparten Speicherplatz und den Lese-Overhead der Komprimierung"""
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute('''
+        SELECT COUNT(*),
+               SUM(CASE WHEN encoding IS NOT NULL THEN 1 ELSE 0 END),
+               SUM(COALESCE(raw_size, LENGTH(CAST(content AS BLOB)))),
+               SUM(LENGTH(CAST(content AS BLOB)))
+        FROM messages
+    ''')
+    total, compressed, raw_bytes, stored_bytes = c.fetchone()
+    conn.close()
+    
+    raw_bytes = raw_bytes or 0
+    stored_bytes = stored_bytes or 0
+    decompressed = read_stats['decompressed']
+    return {
+        'messages': total,
+        'compressed_messages': compressed or 0,
+        'raw_bytes': raw_bytes,
+        'stored_bytes': stored_bytes,
+        'saved_bytes': raw_bytes - stored_bytes,
+        'ratio': stored_bytes / raw_bytes if raw_bytes else 1.0,
+        'decompressed_reads': decompressed,
+        'avg_decompress_ms': read_stats['decompress_seconds'] * 1000 / decompressed if decompressed else 0.0
+    }
+
+@traced('db.train_compression_dictionary')
+def train_compression_dictionary(path, dict_size=112640, sample_limit=5000):
+    """Trainiert ein zstd-Wörterbuch aus gespeicherten Nachrichten"""
+    if zstandard is None:
+        raise RuntimeError("zstandard ist nicht installiert")
+    
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    
+    # Ein Wörterbuch, mit dem noch Nachrichten komprimiert sind, darf nicht überschrieben werden
+    if os.path.exists(path):
+        c.execute('SELECT COUNT(*) FROM messages WHERE encoding = ?', (f'zstd-dict:{_read_dict_id(path)}',))
+        if c.fetchone()[0]:
+            conn.close()
+            raise RuntimeError(f"{path} wird noch von komprimierten Nachrichten verwendet")
+    
+    c.execute('SELECT content, encoding FROM messages ORDER BY id DESC LIMIT ?', (sample_limit,))
+    samples = [decompress_content(row[0], row[1]).encode('utf-8') for row in c.fetchall()]
+    conn.close()
+    
+    dictionary = zstandard.train_dictionary(dict_size, samples)
+    with open(path, 'wb') as f:
+        f.write(dictionary.as_bytes())
+    return path
+
+def _job_from_row(row):
+    return {
+        'id': row[0],
+        'session_id': row[1],
+        'kind': row[2],
+        'watermark': row[3],
+        'status': row[4],
+        'attempts': row[5],
+        'result': json.loads(row[6]) if row[6] else None,
+        'error': row[7],
+        'created_at': row[8],
+        'updated_at': row[9]
+    }
+
+@traced('db.create_analysis_job')
+def create_analysis_job(session_id, kind, watermark, messages):
+    """Legt einen Analyse-Job an oder liefert den bestehenden für denselben Stand.
+
+    Gibt (job_id, created) zurück; fehlgeschlagene Jobs und laufende Jobs mit
+    abgelaufener Lease werden neu eingeplant.
+    """
+    messages = json.dumps(messages)
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute('''
+        INSERT OR IGNORE INTO analysis_jobs (session_id, kind, watermark, messages)
+        VALUES (?, ?, ?, ?)
+    ''', (session_id, kind, watermark, messages))
+    created = c.rowcount == 1
+    
+    c.execute('SELECT id FROM analysis_jobs WHERE session_id = ? AND kind = ? AND watermark = ?',
+              (session_id, kind, watermark))
+    job_id = c.fetchone()[0]
+    # Abgeschlossene Jobs haben ihren Verlauf verworfen, daher neu setzen
+    c.execute(f'''
+        UPDATE analysis_jobs SET status = 'pending', attempts = 0, error = NULL, messages = ?,
+               updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND (status = 'failed' OR ({_STALE_RUNNING}))
+    ''', (messages, job_id, _lease_cutoff()))
+    if c.rowcount == 1:
+        created = True
+    conn.commit()
+    conn.close()
+    return job_id, created
+
+@traced('db.get_analysis_job')
+def get_analysis_job(job_id):
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute('''
+        SELECT id, session_id, kind, watermark, status, attempts, result, error, created_at, updated_at
+        FROM analysis_jobs WHERE id = ?
+    ''', (job_id,))
+    row = c.fetchone()
+    conn.close()
+    return _job_from_row(row) if row else None
+
+@traced('db.claim_analysis_job')
+def claim_analysis_job(job_id):
+    """Markiert einen wartenden (oder verwaisten) Job als laufend; gibt (kind, messages) zurück oder None"""
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute(f'''
+        UPDATE analysis_jobs SET status = 'running', updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND (status = 'pending' OR ({_STALE_RUNNING}))
+    ''', (job_id, _lease_cutoff()))
+    job = None
+    if c.rowcount == 1:
+        c.execute('SELECT kind, messages FROM analysis_jobs WHERE id = ?', (job_id,))
+        kind, messages = c.fetchone()
+        job = (kind, json.loads(messages))
+    conn.commit()
+    conn.close()
+    return job
+
+@traced('db.touch_analysis_job')
+def touch_analysis_job(job_id):
+    """Verlängert die Lease eines laufenden Jobs"""
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute("UPDATE analysis_jobs SET updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+              (job_id,))
+    conn.commit()
+    conn.close()
+
+@traced('db.update_analysis_job')
+def update_analysis_job(job_id, status, attempts, result=None, error=None):
+    """Speichert den Status eines Jobs; abgeschlossene Jobs verwerfen ihre Verlaufskopie"""
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute('''
+        UPDATE analysis_jobs
+        SET status = ?, attempts = ?, result = ?, error = ?, updated_at = CURRENT_TIMESTAMP,
+            messages = CASE WHEN ? IN ('done', 'failed') THEN NULL ELSE messages END
+        WHERE id = ?
+    ''', (status, attempts, json.dumps(result) if result is not None else None, error, status, job_id))
+    conn.commit()
+    conn.close()
+
+@traced('db.save_analysis_result')
+def save_analysis_result(session_id, kind, watermark, result):
+    """Speichert ein außerhalb der Job-Queue berechnetes Ergebnis als abgeschlossenen Job.
+
+    Der Verlauf wird nicht mitgespeichert; abgeschlossene Ergebnisse älterer
+    Stände derselben Session werden entfernt.
+    """
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO analysis_jobs (session_id, kind, watermark, messages, status, result)
+        VALUES (?, ?, ?, NULL, 'done', ?)
+        ON CONFLICT (session_id, kind, watermark) DO UPDATE
+        SET status = 'done', result = excluded.result, error = NULL, messages = NULL,
+            updated_at = CURRENT_TIMESTAMP
+    ''', (session_id, kind, watermark, json.dumps(result)))
+    c.execute('''
+        DELETE FROM analysis_jobs
+        WHERE session_id = ? AND kind = ? AND watermark != ? AND status IN ('done', 'failed')
+    ''', (session_id, kind, watermark))
+    conn.commit()
+    conn.close()
+
+@traced('db.get_analysis_result')
+def get_analysis_result(session_id, kind, watermark):
+    """Liefert das Ergebnis eines abgeschlossenen Jobs für einen Konversationsstand oder None"""
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute('''
+        SELECT result FROM analysis_jobs
+        WHERE session_id = ? AND kind = ? AND watermark = ? AND status = 'done'
+    ''', (session_id, kind, watermark))
+    row = c.fetchone()
+    conn.close()
+    return json.loads(row[0]) if row and row[0] else None
+
+@traced('db.get_pending_analysis_jobs')
+def get_pending_analysis_jobs():
+    """Liefert die IDs wartender Jobs und laufender Jobs mit abgelaufener Lease"""
+    conn = sqlite3.connect('chats.db')
+    c = conn.cursor()
+    c.execute(f"SELECT id FROM analysis_jobs WHERE status = 'pending' OR ({_STALE_RUNNING}) ORDER BY id",
+              (_lease_cutoff(),))
+    job_ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    return job_ids
+
+if __name__ == '__main__':
+    import sys
+    
+    # python database.py compress | stats | train-dict <pfad>
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    init_db()
+    if command == 'compress':
+        print(f"{compress_existing_messages()} Nachrichten komprimiert")
+    elif command == 'train-dict':
+        print(f"Wörterbuch gespeichert: {train_compression_dictionary(sys.argv[2])}")
+    print(json.dumps(get_compression_stats(), indent=2))
\ No newline at end of file
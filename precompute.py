@@ -0,0 +1,93 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from database import save_analysis_result, get_analysis_result
+
+
+class JobCancelled(Exception):
+    """Wird ausgelöst, wenn ein Hintergrundjob durch eine neue Nachricht veraltet ist"""
+
+
+def message_watermark(messages: List[Dict]) -> str:
+    """Kennzeichnet einen Konversationsstand über Nachrichtenanzahl und letzte Nachricht"""
+    if not messages:
+        return '0:'
+    last = messages[-1]
+    digest = hashlib.sha1(f"{last.get('role')}:{last.get('content')}".encode('utf-8')).hexdigest()
+    return f"{len(messages)}:{digest}"
+
+
+class AnalysisPrecomputer:
+    """Berechnet Folgefragen, Zusammenfassung und Visualisierungen spekulativ im Hintergrund.
+
+    Ergebnisse landen als abgeschlossene 'analyze'-Jobs in SQLite und sind damit
+    für alle Worker sichtbar. Abgebrochen werden Jobs nur im eigenen Prozess;
+    ein in einem anderen Worker laufender Job speichert sein Ergebnis unter dem
+    alten Stand, wo es nicht mehr getroffen wird.
+    """
+
+    def __init__(self, compute: Callable[[List[Dict], Callable[[], None]], Dict], max_workers: int = 1):
+        # compute(messages, check_cancelled) liefert das Ergebnis von /api/analyze
+        self.compute = compute
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='precompute')
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._futures = {}
+        self.stats = {'scheduled': 0, 'completed': 0, 'cancelled': 0, 'hits': 0, 'misses': 0}
+
+    def schedule(self, session_id: int, messages: List[Dict]):
+        """Startet die Vorberechnung für den aktuellen Stand einer Session"""
+        messages = [dict(msg) for msg in messages]
+        with self._lock:
+            generation = self._bump(session_id)
+            self.stats['scheduled'] += 1
+            self._futures[session_id] = self.executor.submit(self._run, session_id, generation, messages)
+
+    def invalidate(self, session_id: int):
+        """Bricht laufende Jobs einer Session ab; alte Ergebnisse passen zu keinem neuen Stand"""
+        with self._lock:
+            self._bump(session_id)
+
+    def get(self, session_id: int, messages: List[Dict]) -> Optional[Dict]:
+        """Liefert ein vorberechnetes Ergebnis, falls es zum Konversationsstand passt"""
+        result = get_analysis_result(session_id, 'analyze', message_watermark(messages))
+        with self._lock:
+            self.stats['hits' if result is not None else 'misses'] += 1
+        return result
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+    def _bump(self, session_id: int) -> int:
+        # Muss unter self._lock aufgerufen werden
+        generation = self._generations.get(session_id, 0) + 1
+        self._generations[session_id] = generation
+        future = self._futures.pop(session_id, None)
+        if future and future.cancel():
+            self.stats['cancelled'] += 1
+        return generation
+
+    def _run(self, session_id: int, generation: int, messages: List[Dict]):
+        def check_cancelled():
+            if self._generations.get(session_id) != generation:
+                raise JobCancelled()
+
+        try:
+            check_cancelled()
+            result = self.compute(messages, check_cancelled)
+        except JobCancelled:
+            with self._lock:
+                self.stats['cancelled'] += 1
+            return
+        except Exception as e:
+            print(f"Fehler bei der Vorberechnung für Session {session_id}: {str(e)}")
+            return
+
+        with self._lock:
+            if self._generations.get(session_id) != generation:
+                return
+            self._futures.pop(session_id, None)
+            self.stats['completed'] += 1
+        save_analysis_result(session_id, 'analyze', message_watermark(messages), result)
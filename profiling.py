@@ -0,0 +1,235 @@
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+_current_trace = ContextVar('current_trace', default=None)
+
+
+class Trace:
+    """Zeitmessungen eines einzelnen Requests"""
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+        self.events = []
+        self.depth = 0
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def to_dict(self, duration_ms: float, first_byte_ms: Optional[float] = None) -> Dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'worker_pid': os.getpid(),
+            'duration_ms': round(duration_ms, 2),
+            'first_byte_ms': round(first_byte_ms, 2) if first_byte_ms is not None else None,
+            'spans': sorted(self.spans, key=lambda span: (span['start_ms'], span['depth'])),
+            'events': self.events
+        }
+
+
+@contextmanager
+def span(name: str):
+    """Misst einen Abschnitt, sofern für den aktuellen Request ein Trace aktiv ist"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    trace.depth += 1
+    try:
+        yield
+    finally:
+        trace.depth -= 1
+        trace.spans.append({
+            'name': name,
+            'depth': trace.depth,
+            'start_ms': round((start - trace.start) * 1000, 2),
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2)
+        })
+
+
+def traced(name: str):
+    """Dekorator, der jeden Aufruf der Funktion als Span erfasst"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def event(name: str):
+    """Markiert einen Zeitpunkt (z. B. erstes Byte der Upstream-Antwort) im aktuellen Trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.events.append({'name': name, 'at_ms': round(trace.elapsed_ms(), 2)})
+
+
+class StackSampler:
+    """Einfacher Sampling-Profiler für den Thread eines Requests"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 30):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, top: int = 15) -> List[Dict]:
+        self._stop.set()
+        self._thread.join()
+        total = sum(self.samples.values()) or 1
+        return [
+            {'stack': stack, 'samples': count, 'share': round(count / total, 3)}
+            for stack, count in self.samples.most_common(top)
+        ]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(f"{frame.f_code.co_filename.rsplit('/', 1)[-1]}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+
+class RequestProfiler:
+    """Aktiviert Traces per Header oder Sampling-Rate und protokolliert langsame Requests.
+
+    Header "X-Profile: 1" erzwingt einen Trace, "X-Profile: sample" zusätzlich
+    den Sampling-Profiler. Die Einstellungen lassen sich zur Laufzeit ändern;
+    mit load_settings/save_settings werden sie geteilt gespeichert und von
+    jedem Worker spätestens nach reload_interval Sekunden übernommen. Die
+    Traces selbst bleiben im jeweiligen Prozess. Bei gestreamten Antworten
+    zählt für langsame Requests die Zeit bis zum ersten Byte.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, slow_ms: float = 2000, sampler: bool = False,
+                 history: int = 50, load_settings: Optional[Callable[[], Optional[Dict]]] = None,
+                 save_settings: Optional[Callable[[Dict], None]] = None, reload_interval: float = 1.0):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.sampler = sampler
+        self.recent_traces = deque(maxlen=history)
+        self.load_settings = load_settings
+        self.save_settings = save_settings
+        self.reload_interval = reload_interval
+        self._last_reload = None
+
+    def init_app(self, app):
+        from flask import g, request
+
+        @app.before_request
+        def start_trace():
+            g.profile_start = time.perf_counter()
+            _current_trace.set(None)
+            self._reload_settings()
+            header = request.headers.get('X-Profile', '').lower()
+            if header in ('1', 'true', 'sample') or random.random() < self.sample_rate:
+                g.profile_trace = Trace(f"{request.method} {request.path}")
+                _current_trace.set(g.profile_trace)
+                if header == 'sample' or self.sampler:
+                    g.profile_sampler = StackSampler(threading.get_ident())
+                    g.profile_sampler.start()
+
+        @app.after_request
+        def finish_trace(response):
+            start = g.pop('profile_start', None)
+            trace = g.pop('profile_trace', None)
+            sampler = g.pop('profile_sampler', None)
+            name = f"{request.method} {request.path}"
+            if start is None:
+                return response
+            if trace is not None:
+                response.headers['X-Trace-Id'] = trace.id
+            timing = {}
+            if response.is_streamed:
+                response.response = self._time_first_chunk(response.response, timing)
+            # Gestreamte Antworten erst nach dem letzten Byte abschließen
+            response.call_on_close(lambda: self._finish(name, start, trace, sampler, timing.get('first_byte')))
+            return response
+
+    @staticmethod
+    def _time_first_chunk(chunks, timing: Dict):
+        try:
+            for chunk in chunks:
+                timing.setdefault('first_byte', time.perf_counter())
+                yield chunk
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _finish(self, name: str, start: float, trace: Optional[Trace], sampler: Optional[StackSampler],
+                first_byte: Optional[float] = None):
+        duration_ms = (time.perf_counter() - start) * 1000
+        first_byte_ms = (first_byte - start) * 1000 if first_byte is not None else None
+        # Lange Streams sind normal; entscheidend ist, wann die Antwort beginnt
+        is_slow = (first_byte_ms if first_byte_ms is not None else duration_ms) >= self.slow_ms
+        _current_trace.set(None)
+
+        if trace is None:
+            if is_slow:
+                first_byte_info = f", erstes Byte nach {first_byte_ms:.0f} ms" if first_byte_ms is not None else ''
+                print(f"Langsamer Request: {name} {duration_ms:.0f} ms{first_byte_info} (ohne Trace)")
+            return
+
+        result = trace.to_dict(duration_ms, first_byte_ms)
+        if sampler is not None:
+            result['profile'] = sampler.stop()
+        self.recent_traces.append(result)
+        if is_slow:
+            print(f"Langsamer Request: {json.dumps(result, ensure_ascii=False)}")
+
+    def get_settings(self) -> Dict:
+        return {'sample_rate': self.sample_rate, 'slow_ms': self.slow_ms, 'sampler': self.sampler}
+
+    def update_settings(self, settings: Dict):
+        self._apply_settings(settings)
+        if self.save_settings:
+            self.save_settings(self.get_settings())
+            self._last_reload = time.monotonic()
+
+    def _apply_settings(self, settings: Dict):
+        # Erst alle Werte prüfen, damit ungültige Eingaben nichts teilweise ändern
+        sample_rate = min(max(float(settings.get('sample_rate', self.sample_rate)), 0.0), 1.0)
+        slow_ms = float(settings.get('slow_ms', self.slow_ms))
+        sampler = bool(settings.get('sampler', self.sampler))
+        self.sample_rate, self.slow_ms, self.sampler = sample_rate, slow_ms, sampler
+
+    def _reload_settings(self):
+        # Von anderen Workern gespeicherte Einstellungen übernehmen
+        if self.load_settings is None:
+            return
+        now = time.monotonic()
+        if self._last_reload is not None and now - self._last_reload < self.reload_interval:
+            return
+        self._last_reload = now
+        try:
+            settings = self.load_settings()
+            if settings:
+                self._apply_settings(settings)
+        except Exception as e:
+            print(f"Profiling-Einstellungen konnten nicht geladen werden: {str(e)}")
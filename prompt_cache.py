@@ -0,0 +1,170 @@
+import hashlib
+import re
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Mersenne-Primzahl für die MinHash-Permutationen
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class SimilarPromptCache:
+    """Cache für optimierte Prompts, der auch nahezu identische Eingaben erkennt.
+
+    Prompts werden normalisiert, in Zeichen-Shingles zerlegt und per MinHash
+    signiert; LSH-Buckets liefern Kandidaten, deren geschätzte Jaccard-
+    Ähnlichkeit mit dem Schwellwert verglichen wird. Zahlen und Operatoren
+    müssen exakt übereinstimmen. Im Audit-Modus werden Treffer nur
+    protokolliert und nicht ausgeliefert.
+    """
+
+    # Nur satzabschließende Zeichen entfernen, Dezimalpunkte und Operatoren bleiben erhalten
+    SENTENCE_PUNCTUATION = re.compile(r"[.,!?;:]+(?=\s|$)")
+    WHITESPACE = re.compile(r"\s+")
+    NUMBERS_AND_OPERATORS = re.compile(r"\d+(?:[.,]\d+)*|[-+*/^=<>%×÷]")
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 4, capacity: int = 10000, audit: bool = False):
+        if num_perm % bands:
+            raise ValueError("num_perm muss durch bands teilbar sein")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.capacity = capacity
+        self.audit = audit
+
+        # Feste Permutationsparameter, damit Signaturen reproduzierbar sind
+        self._permutations = [
+            (int.from_bytes(hashlib.sha1(f"a{i}".encode()).digest()[:8], 'big') % _PRIME or 1,
+             int.from_bytes(hashlib.sha1(f"b{i}".encode()).digest()[:8], 'big') % _PRIME)
+            for i in range(num_perm)
+        ]
+        self._entries = OrderedDict()
+        self._buckets = [{} for _ in range(bands)]
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'audit_hits': 0, 'misses': 0,
+                      'similarity_histogram': [0] * 10}
+
+    def normalize(self, text: str) -> str:
+        """Kleinschreibung, ohne satzabschließende Zeichen und mit vereinheitlichten Leerzeichen"""
+        text = self.WHITESPACE.sub(' ', text.lower()).strip()
+        return self.SENTENCE_PUNCTUATION.sub('', text)
+
+    def numbers_and_operators(self, normalized: str) -> Tuple[str, ...]:
+        """Zahlen und Operatoren, die bei einem Treffer identisch sein müssen"""
+        return tuple(self.NUMBERS_AND_OPERATORS.findall(normalized))
+
+    def signature(self, normalized: str) -> Tuple[int, ...]:
+        """Berechnet die MinHash-Signatur der Zeichen-Shingles"""
+        size = self.shingle_size
+        shingles = {normalized[i:i + size] for i in range(max(1, len(normalized) - size + 1))}
+        hashes = [struct.unpack('<I', hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest())[0]
+                  for shingle in shingles]
+        return tuple(
+            min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH
+            for a, b in self._permutations
+        )
+
+    def lookup(self, prompt: str, language: str, target_language: str,
+               audit: Optional[bool] = None) -> Optional[str]:
+        """Liefert eine frühere Optimierung für einen ähnlichen Prompt derselben Sprache.
+
+        audit überschreibt den Audit-Modus des Caches für diesen Aufruf.
+        """
+        audit = self.audit if audit is None else audit
+        normalized = self.normalize(prompt)
+        signature = self.signature(normalized)
+        numbers = self.numbers_and_operators(normalized)
+
+        with self._lock:
+            self.stats['lookups'] += 1
+            best_similarity, best_entry = 0.0, None
+            for entry_id in self._candidates(signature):
+                entry = self._entries[entry_id]
+                if entry['language'] != language or entry['target_language'] != target_language:
+                    continue
+                if entry['numbers'] != numbers:
+                    continue
+                if entry['normalized'] == normalized:
+                    similarity = 1.0
+                else:
+                    similarity = sum(x == y for x, y in zip(signature, entry['signature'])) / self.num_perm
+                if similarity > best_similarity:
+                    best_similarity, best_entry = similarity, entry
+
+            if best_entry is not None:
+                self.stats['similarity_histogram'][min(int(best_similarity * 10), 9)] += 1
+
+            if best_entry is None or best_similarity < self.threshold:
+                self.stats['misses'] += 1
+                return None
+
+            if audit:
+                self.stats['audit_hits'] += 1
+                print(f"Prompt-Cache (Audit): Treffer mit Ähnlichkeit {best_similarity:.2f} "
+                      f"für {prompt[:60]!r} ~ {best_entry['prompt'][:60]!r}")
+                return None
+
+            self.stats['hits'] += 1
+            return best_entry['result']
+
+    def add(self, prompt: str, language: str, target_language: str, result: str):
+        """Speichert eine Optimierung und indiziert sie in den LSH-Buckets"""
+        normalized = self.normalize(prompt)
+        signature = self.signature(normalized)
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                'prompt': prompt,
+                'normalized': normalized,
+                'numbers': self.numbers_and_operators(normalized),
+                'signature': signature,
+                'language': language,
+                'target_language': target_language,
+                'result': result
+            }
+            for band, key in enumerate(self._band_keys(signature)):
+                self._buckets[band].setdefault(key, set()).add(entry_id)
+
+            if len(self._entries) > self.capacity:
+                self._evict()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats['lookups']
+            return {
+                **self.stats,
+                'similarity_histogram': list(self.stats['similarity_histogram']),
+                'entries': len(self._entries),
+                'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+                'audit_hit_rate': self.stats['audit_hits'] / lookups if lookups else 0.0,
+                'threshold': self.threshold,
+                'audit': self.audit
+            }
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, ...]]:
+        return [signature[band * self.rows:(band + 1) * self.rows] for band in range(self.bands)]
+
+    def _candidates(self, signature: Tuple[int, ...]) -> set:
+        # Muss unter self._lock aufgerufen werden
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates |= self._buckets[band].get(key, set())
+        return candidates
+
+    def _evict(self):
+        # Ältesten Eintrag samt Bucket-Referenzen entfernen
+        entry_id, entry = self._entries.popitem(last=False)
+        for band, key in enumerate(self._band_keys(entry['signature'])):
+            bucket = self._buckets[band].get(key)
+            if bucket:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band][key]
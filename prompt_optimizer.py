@@ -1,9 +1,105 @@
 import requests
 import json
-from typing import List, Dict, Optional
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Iterable, Iterator
 import langdetect
+from langdetect import DetectorFactory
+from langdetect.detector_factory import init_factory
 import iso639
 from datetime import datetime
+from prompt_cache import SimilarPromptCache
+from profiling import traced
+
+class LanguageDetector:
+    """Deterministische, gecachte Spracherkennung mit schnellem Pfad für kurze Texte"""
+
+    # Häufige Funktionswörter für die schnelle Erkennung ohne langdetect
+    STOPWORDS = {
+        'de': {'der', 'die', 'das', 'und', 'ist', 'nicht', 'ich', 'du', 'sie', 'wie', 'was', 'ein', 'eine', 'mit', 'für', 'auf', 'den', 'bitte', 'kannst', 'mir'},
+        'en': {'the', 'and', 'is', 'are', 'not', 'you', 'what', 'how', 'a', 'an', 'with', 'for', 'on', 'of', 'to', 'please', 'can', 'me', 'this', 'that'},
+        'fr': {'le', 'la', 'les', 'et', 'est', 'pas', 'je', 'tu', 'vous', 'comment', 'un', 'une', 'avec', 'pour', 'sur', 'des', 'du', 'que', 'moi', 'ce'},
+        'es': {'el', 'la', 'los', 'las', 'y', 'es', 'no', 'yo', 'tu', 'como', 'que', 'un', 'una', 'con', 'para', 'por', 'del', 'me', 'puedes', 'esto'},
+        'it': {'il', 'lo', 'gli', 'e', 'non', 'io', 'tu', 'come', 'che', 'un', 'una', 'con', 'per', 'su', 'del', 'della', 'mi', 'puoi', 'questo', 'sono'}
+    }
+    WORD_PATTERN = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+    def __init__(self, supported_languages, default_language: str = 'en', cache_size: int = 4096,
+                 short_text_length: int = 20, seed: int = 0):
+        self.supported_languages = set(supported_languages)
+        self.default_language = default_language
+        self.cache_size = cache_size
+        self.short_text_length = short_text_length
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'fast_path': 0}
+
+        # Zufallsstichproben von langdetect deterministisch machen und Profile vorab laden
+        DetectorFactory.seed = seed
+        init_factory()
+
+    def detect(self, text: str, hint: Optional[str] = None) -> str:
+        """Erkennt die Sprache; ein unterstützter Hinweis des Aufrufers hat Vorrang"""
+        if hint in self.supported_languages:
+            with self._lock:
+                self.stats['fast_path'] += 1
+            return hint
+
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._cache[key]
+
+        lang_code = self._fast_detect(text)
+        with self._lock:
+            self.stats['fast_path' if lang_code else 'misses'] += 1
+        if not lang_code:
+            try:
+                lang_code = langdetect.detect(text)
+            except Exception:
+                lang_code = self.default_language
+            if lang_code not in self.supported_languages:
+                lang_code = self.default_language
+
+        with self._lock:
+            self._cache[key] = lang_code
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return lang_code
+
+    def _fast_detect(self, text: str) -> Optional[str]:
+        """Schätzt die Sprache kurzer oder reiner ASCII-Texte über Funktionswörter"""
+        stripped = text.strip()
+        is_short = len(stripped) < self.short_text_length
+        if not is_short and not stripped.isascii():
+            return None
+
+        words = [word.lower() for word in self.WORD_PATTERN.findall(stripped)]
+        scores = sorted(
+            ((sum(word in stopwords for word in words), lang_code)
+             for lang_code, stopwords in self.STOPWORDS.items()
+             if lang_code in self.supported_languages),
+            reverse=True
+        )
+        best_score, best_language = scores[0] if scores else (0, None)
+        runner_up = scores[1][0] if len(scores) > 1 else 0
+
+        # Ohne Funktionswörter entscheidet langdetect
+        if best_score == 0:
+            return None
+        # Eindeutiger Treffer: mindestens zwei Funktionswörter und doppelt so viele wie die Konkurrenz
+        if best_score >= 2 and best_score >= 2 * runner_up:
+            return best_language
+        # Bei kurzen Texten genügt ein Vorsprung von zwei Funktionswörtern; fr/es/it teilen
+        # viele Wörter (tu, un, la, que), ein einzelnes Wort entscheidet daher nicht
+        if is_short and best_score - runner_up >= 2:
+            return best_language
+        return None
 
 class LanguageHandler:
     """Verwaltet die Sprachverarbeitung und -erkennung"""
@@ -16,14 +112,12 @@ class LanguageHandler:
             'es': {'name': 'Español', 'formatting': {'date': 'DD/MM/YYYY', 'quotes': '«»'}},
             'it': {'name': 'Italiano', 'formatting': {'date': 'DD/MM/YYYY', 'quotes': '«»'}}
         }
+        self.detector = LanguageDetector(self.supported_languages)
     
-    def detect_language(self, text: str) -> str:
+    @traced('optimizer.detect_language')
+    def detect_language(self, text: str, hint: Optional[str] = None) -> str:
         """Erkennt die Sprache des Textes"""
-        try:
-            lang_code = langdetect.detect(text)
-            return lang_code if lang_code in self.supported_languages else 'en'
-        except:
-            return 'en'
+        return self.detector.detect(text, hint)
     
     def get_language_name(self, lang_code: str) -> str:
         """Gibt den vollständigen Sprachnamen zurück"""
@@ -150,26 +244,53 @@ class AdaptiveLanguageHandler(LanguageHandler):
             'score': f['score']
         } for f in recent_feedback]
 
+class ContextCache:
+    """Gemeinsame, inkrementell gepflegte Textform von Nachrichtenverläufen.
+
+    Einträge sind an das Listenobjekt gebunden; neu angehängte Nachrichten
+    werden ergänzt, geänderte letzte Nachrichten lösen einen Neuaufbau aus.
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @traced('optimizer.serialize_context')
+    def get(self, messages: List[Dict], last: Optional[int] = None) -> str:
+        """Liefert "role: content"-Zeilen des Verlaufs, optional nur der letzten Nachrichten"""
+        with self._lock:
+            entry = self._entries.get(id(messages))
+            if entry is None or entry['messages'] is not messages or not self._is_prefix(entry, messages):
+                entry = {'messages': messages, 'lines': [], 'last': None, 'texts': {}}
+                self._entries[id(messages)] = entry
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(id(messages))
+
+            if len(entry['lines']) < len(messages):
+                entry['lines'].extend(f"{msg['role']}: {msg['content']}" for msg in messages[len(entry['lines']):])
+                entry['last'] = (messages[-1], messages[-1]['content'])
+                entry['texts'] = {}
+
+            if last not in entry['texts']:
+                lines = entry['lines'][-last:] if last else entry['lines']
+                entry['texts'][last] = "\n".join(lines)
+            return entry['texts'][last]
+
+    @staticmethod
+    def _is_prefix(entry: Dict, messages: List[Dict]) -> bool:
+        count = len(entry['lines'])
+        if count > len(messages):
+            return False
+        if count == 0:
+            return True
+        last_message, last_content = entry['last']
+        return messages[count - 1] is last_message and last_message['content'] == last_content
+
+
 class PromptOptimizer:
-    def __init__(self, base_url="http://localhost:1234"):
-        self.base_url = base_url
-        self.completion_url = f"{base_url}/v1/chat/completions"
-        self.language_handler = AdaptiveLanguageHandler()  # Verwende die erweiterte Handler-Klasse
-        
-    def optimize_prompt(self, original_prompt: str, target_language: Optional[str] = None) -> str:
-        """Optimiert einen Prompt mit erweiterter Sprachunterstützung und KI-Funktionen"""
-        # Sprache erkennen oder Zielsprache verwenden
-        source_language = self.language_handler.detect_language(original_prompt)
-        target_language = target_language or source_language
-        
-        # Kulturellen Kontext abrufen
-        cultural_context = self.language_handler.get_cultural_context(target_language)
-        
-        # Gelernte Muster anwenden
-        pre_processed_prompt = self.language_handler.apply_learned_patterns(original_prompt, target_language)
-        
-        # Systemnachricht mit erweiterten Einstellungen vorbereiten
-        system_message = '''You are a multilingual AI assistant capable of understanding and communicating in various languages.
+    OPTIMIZE_TEMPLATE = '''You are a multilingual AI assistant capable of understanding and communicating in various languages.
 
 Source language: {source_lang}
 Target language: {target_lang}
@@ -204,51 +325,7 @@ Remember to:
 - Use language-specific structures and expressions
 - Consider formal/informal address ({formal_address})'''
 
-        # Formatierungsregeln und Kontext abrufen
-        formatting_rules = self.language_handler.get_formatting_rules(target_language)
-        
-        # Prompt vorbereiten
-        formatted_prompt = system_message.format(
-            source_lang=self.language_handler.get_language_name(source_language),
-            target_lang=self.language_handler.get_language_name(target_language),
-            formatting_rules=json.dumps(formatting_rules, indent=2),
-            cultural_context=json.dumps(cultural_context, indent=2),
-            formality=cultural_context.get('cultural_norms', {}).get('formality', 'standard'),
-            formal_address=cultural_context.get('formal_address', False)
-        ).replace("{{user_prompt}}", pre_processed_prompt)
-
-        messages = [
-            {"role": "system", "content": formatted_prompt},
-            {"role": "user", "content": pre_processed_prompt}
-        ]
-        
-        try:
-            response = requests.post(
-                self.completion_url,
-                json={
-                    "messages": messages,
-                    "temperature": 0.7,
-                    "max_tokens": 2000
-                },
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                improved_prompt = response.json()["choices"][0]["message"]["content"]
-                # Führe eine Verifikation durch
-                return self.verify_prompt(improved_prompt, original_prompt)
-            else:
-                return original_prompt
-        except Exception as e:
-            print(f"Fehler bei der Prompt-Optimierung: {str(e)}")
-            return original_prompt
-
-    def verify_prompt(self, improved_prompt: str, original_prompt: str, target_language: Optional[str] = None) -> str:
-        """Verifiziert den optimierten Prompt mit Sprachunterstützung"""
-        # Sprache erkennen oder Zielsprache verwenden
-        target_language = target_language or self.language_handler.detect_language(improved_prompt)
-        
-        verify_message = '''You are a multilingual AI assistant specializing in prompt verification.
+    VERIFY_TEMPLATE = '''You are a multilingual AI assistant specializing in prompt verification.
 
 Target language: {target_lang}
 Formatting rules: {formatting_rules}
@@ -275,17 +352,201 @@ Verification criteria:
 
 IMPORTANT: Return only the verified text using the language-specific quotation marks.'''
 
-        # Formatierungsregeln und Anführungszeichen abrufen
-        formatting_rules = self.language_handler.get_formatting_rules(target_language)
-        quotes = formatting_rules.get('quotes', '""')
-        
-        # Nachricht formatieren
-        formatted_message = verify_message.format(
-            target_lang=self.language_handler.get_language_name(target_language),
-            formatting_rules=json.dumps(formatting_rules, indent=2),
-            quote_start=quotes[0],
-            quote_end=quotes[1]
+    # Abschnitte der kombinierten Analyse: Beschreibung für den Prompt und JSON-Schema für response_format
+    COMBINED_SECTIONS = {
+        'conversation_flow': (
+            'string containing a flow diagram in Mermaid format (participants, key topics, relationships between messages)',
+            {'type': 'string'}
+        ),
+        'knowledge_graph': (
+            'string containing a knowledge graph in Graphviz DOT format (entities, relationships, key concepts)',
+            {'type': 'string'}
+        ),
+        'topic_evolution': (
+            'array of objects with "topic", "start", "end" (message indices) and "importance" (0-1)',
+            {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'topic': {'type': 'string'},
+                        'start': {'type': 'integer', 'minimum': 0},
+                        'end': {'type': 'integer', 'minimum': 0},
+                        'importance': {'type': 'number', 'minimum': 0, 'maximum': 1}
+                    },
+                    'required': ['topic', 'start', 'end', 'importance'],
+                    'additionalProperties': False
+                }
+            }
+        ),
+        'sentiment_timeline': (
+            'object with "messages" (array of {"index", "role", "score" from -1 to 1}) and "trend" (string)',
+            {
+                'type': 'object',
+                'properties': {
+                    'messages': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'index': {'type': 'integer', 'minimum': 0},
+                                'role': {'type': 'string'},
+                                'score': {'type': 'number', 'minimum': -1, 'maximum': 1}
+                            },
+                            'required': ['index', 'role', 'score'],
+                            'additionalProperties': False
+                        }
+                    },
+                    'trend': {'type': 'string'}
+                },
+                'required': ['messages', 'trend'],
+                'additionalProperties': False
+            }
+        ),
+        'summary': (
+            'string with a concise summary of the key points, core topics, insights and open questions',
+            {'type': 'string'}
+        )
+    }
+    # Token-Budget je Abschnitt wie bei den Einzelaufrufen
+    SECTION_MAX_TOKENS = 1000
+
+    def __init__(self, base_url="http://localhost:1234", prompt_cache: Optional[SimilarPromptCache] = None):
+        self.base_url = base_url
+        self.completion_url = f"{base_url}/v1/chat/completions"
+        self.language_handler = AdaptiveLanguageHandler()  # Verwende die erweiterte Handler-Klasse
+        self.context_cache = ContextCache()
+        # Optionaler Cache für nahezu identische Prompts
+        self.prompt_cache = prompt_cache
+        # Vorgerenderte Systemnachrichten je Sprache
+        self._optimize_templates = {}
+        self._verify_templates = {}
+
+    @traced('optimizer.optimize_template')
+    def _get_optimize_template(self, source_language: str, target_language: str) -> str:
+        """Rendert die Optimierungs-Systemnachricht einmal je Sprachpaar"""
+        key = (source_language, target_language)
+        if key not in self._optimize_templates:
+            cultural_context = self.language_handler.get_cultural_context(target_language)
+            formatting_rules = self.language_handler.get_formatting_rules(target_language)
+            self._optimize_templates[key] = self.OPTIMIZE_TEMPLATE.format(
+                source_lang=self.language_handler.get_language_name(source_language),
+                target_lang=self.language_handler.get_language_name(target_language),
+                formatting_rules=json.dumps(formatting_rules, indent=2),
+                cultural_context=json.dumps(cultural_context, indent=2),
+                formality=cultural_context.get('cultural_norms', {}).get('formality', 'standard'),
+                formal_address=cultural_context.get('formal_address', False)
+            )
+        return self._optimize_templates[key]
+
+    @traced('optimizer.verify_template')
+    def _get_verify_template(self, target_language: str) -> str:
+        """Rendert die Verifikations-Systemnachricht einmal je Zielsprache"""
+        if target_language not in self._verify_templates:
+            formatting_rules = self.language_handler.get_formatting_rules(target_language)
+            quotes = formatting_rules.get('quotes', '""')
+            self._verify_templates[target_language] = self.VERIFY_TEMPLATE.format(
+                target_lang=self.language_handler.get_language_name(target_language),
+                formatting_rules=json.dumps(formatting_rules, indent=2),
+                quote_start=quotes[0],
+                quote_end=quotes[1]
+            )
+        return self._verify_templates[target_language]
+        
+    @traced('optimizer.optimize_prompt')
+    def optimize_prompt(self, original_prompt: str, target_language: Optional[str] = None,
+                        cache_audit: Optional[bool] = None) -> str:
+        """Optimiert einen Prompt mit erweiterter Sprachunterstützung und KI-Funktionen"""
+        try:
+            return self._optimize_prompt(original_prompt, target_language, cache_audit)
+        except Exception as e:
+            print(f"Fehler bei der Prompt-Optimierung: {str(e)}")
+            return original_prompt
+
+    def _optimize_prompt(self, original_prompt: str, target_language: Optional[str] = None,
+                         cache_audit: Optional[bool] = None) -> str:
+        """Wie optimize_prompt, löst bei Fehlern des Modellaufrufs aber eine Ausnahme aus"""
+        # Sprache erkennen oder Zielsprache verwenden
+        source_language = self.language_handler.detect_language(original_prompt)
+        target_language = target_language or source_language
+        
+        # Frühere Optimierung eines ähnlichen Prompts wiederverwenden
+        if self.prompt_cache:
+            cached_prompt = self.prompt_cache.lookup(original_prompt, source_language, target_language,
+                                                     audit=cache_audit)
+            if cached_prompt is not None:
+                return cached_prompt
+        
+        # Gelernte Muster anwenden
+        pre_processed_prompt = self.language_handler.apply_learned_patterns(original_prompt, target_language)
+        
+        # Vorgerenderte Systemnachricht für das Sprachpaar verwenden; der Prompt selbst folgt als Nutzernachricht
+        formatted_prompt = self._get_optimize_template(source_language, target_language)
+
+        messages = [
+            {"role": "system", "content": formatted_prompt},
+            {"role": "user", "content": pre_processed_prompt}
+        ]
+        
+        response = requests.post(
+            self.completion_url,
+            json={
+                "messages": messages,
+                "temperature": 0.7,
+                "max_tokens": 2000
+            },
+            headers={"Content-Type": "application/json"}
         )
+        
+        if response.status_code != 200:
+            raise RuntimeError(f"API-Fehler: {response.status_code}")
+        improved_prompt = response.json()["choices"][0]["message"]["content"]
+        # Führe eine Verifikation durch
+        verified_prompt = self.verify_prompt(improved_prompt, original_prompt, target_language)
+        if self.prompt_cache:
+            self.prompt_cache.add(original_prompt, source_language, target_language, verified_prompt)
+        return verified_prompt
+
+    def optimize_prompts(self, prompts: Iterable[str], max_workers: int = 4,
+                         target_language: Optional[str] = None) -> Iterator[Dict]:
+        """Optimiert viele Prompts parallel und liefert die Ergebnisse in Fertigstellungsreihenfolge.
+
+        Identische Prompts werden nur einmal optimiert; jedes Ergebnis enthält
+        den Index des Prompts in der Eingabe und einen status ('ok' mit
+        improved_prompt oder 'error' mit error).
+        """
+        # Identische Eingaben zusammenfassen
+        indices_by_prompt = OrderedDict()
+        for index, prompt in enumerate(prompts):
+            indices_by_prompt.setdefault(prompt, []).append(index)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {
+                executor.submit(self._optimize_prompt, prompt, target_language): prompt
+                for prompt in indices_by_prompt
+            }
+            try:
+                for future in as_completed(futures):
+                    prompt = futures[future]
+                    try:
+                        result = {'status': 'ok', 'improved_prompt': future.result()}
+                    except Exception as e:
+                        result = {'status': 'error', 'error': str(e)}
+                    for index in indices_by_prompt[prompt]:
+                        yield {'index': index, 'prompt': prompt, **result}
+            finally:
+                # Bei Abbruch durch den Aufrufer ausstehende Prompts verwerfen
+                for future in futures:
+                    future.cancel()
+
+    @traced('optimizer.verify_prompt')
+    def verify_prompt(self, improved_prompt: str, original_prompt: str, target_language: Optional[str] = None) -> str:
+        """Verifiziert den optimierten Prompt mit Sprachunterstützung"""
+        # Sprache erkennen oder Zielsprache verwenden
+        target_language = target_language or self.language_handler.detect_language(improved_prompt)
+        
+        formatting_rules = self.language_handler.get_formatting_rules(target_language)
+        formatted_message = self._get_verify_template(target_language)
 
         messages = [
             {"role": "system", "content": formatted_message},
@@ -318,12 +579,13 @@ IMPORTANT: Return only the verified text using the language-specific quotation m
         except Exception:
             return self.language_handler.format_text(improved_prompt, target_language)
     
+    @traced('optimizer.analyze_context')
     def analyze_context(self, message_history):
         """Analysiert den Kontext der Konversation und gibt Verbesserungsvorschläge"""
         system_message = """Analysiere den Konversationsverlauf und identifiziere wichtige Themen, 
         fehlende Informationen und mögliche Folgefragen. Gib Vorschläge zur Verbesserung der Konversationsqualität."""
         
-        context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in message_history[-5:]])
+        context = self.context_cache.get(message_history, last=5)
         
         messages = [
             {"role": "system", "content": system_message},
@@ -348,6 +610,7 @@ IMPORTANT: Return only the verified text using the language-specific quotation m
         except Exception:
             return None
     
+    @traced('optimizer.suggest_followup_questions')
     def suggest_followup_questions(self, last_response):
         """Generiert Vorschläge für sinnvolle Folgefragen"""
         system_message = """Basierend auf der letzten Antwort, generiere 3-5 relevante Folgefragen, 
@@ -377,12 +640,13 @@ IMPORTANT: Return only the verified text using the language-specific quotation m
         except Exception:
             return []
 
+    @traced('optimizer.summarize_conversation')
     def summarize_conversation(self, message_history):
         """Erstellt eine Zusammenfassung der bisherigen Konversation"""
         system_message = """Erstelle eine prägnante Zusammenfassung der wichtigsten Punkte 
         dieser Konversation. Hebe Kernthemen, wichtige Erkenntnisse und offene Fragen hervor."""
         
-        context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in message_history])
+        context = self.context_cache.get(message_history)
         
         messages = [
             {"role": "system", "content": system_message},
@@ -434,12 +698,13 @@ IMPORTANT: Return only the verified text using the language-specific quotation m
             'cultural_context': self.language_handler.get_cultural_context(language)
         }
 
+    @traced('optimizer.generate_conversation_flow')
     def generate_conversation_flow(self, messages: List[Dict]) -> Dict:
         """Generates a conversation flow visualization"""
         system_message = """Analyze this conversation and generate a flow diagram in Mermaid format.
         Include participants, key topics, and relationships between messages."""
         
-        context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+        context = self.context_cache.get(messages)
         
         messages = [
             {"role": "system", "content": system_message},
@@ -466,12 +731,13 @@ IMPORTANT: Return only the verified text using the language-specific quotation m
         except Exception:
             return {'error': 'Failed to generate flow'}
 
+    @traced('optimizer.generate_knowledge_graph')
     def generate_knowledge_graph(self, messages: List[Dict]) -> Dict:
         """Generates a knowledge graph from conversation"""
         system_message = """Analyze this conversation and generate a knowledge graph in Graphviz DOT format.
         Include entities, relationships, and key concepts."""
         
-        context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+        context = self.context_cache.get(messages)
         
         messages = [
             {"role": "system", "content": system_message},
@@ -498,12 +764,13 @@ IMPORTANT: Return only the verified text using the language-specific quotation m
         except Exception:
             return {'error': 'Failed to generate graph'}
 
+    @traced('optimizer.generate_topic_evolution')
     def generate_topic_evolution(self, messages: List[Dict]) -> Dict:
         """Generates topic evolution timeline"""
         system_message = """Analyze this conversation and generate a timeline of topics in JSON format.
         Include topic names, start/end points, and importance scores."""
         
-        context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+        context = self.context_cache.get(messages)
         
         messages = [
             {"role": "system", "content": system_message},
@@ -530,12 +797,13 @@ IMPORTANT: Return only the verified text using the language-specific quotation m
         except Exception:
             return {'error': 'Failed to generate timeline'}
 
+    @traced('optimizer.generate_sentiment_timeline')
     def generate_sentiment_timeline(self, messages: List[Dict]) -> Dict:
         """Generates sentiment analysis timeline"""
         system_message = """Analyze this conversation and generate a sentiment timeline in JSON format.
         Include sentiment scores for each message and overall trend."""
         
-        context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+        context = self.context_cache.get(messages)
         
         messages = [
             {"role": "system", "content": system_message},
@@ -561,3 +829,150 @@ IMPORTANT: Return only the verified text using the language-specific quotation m
             return {'error': 'Failed to generate sentiment analysis'}
         except Exception:
             return {'error': 'Failed to generate sentiment analysis'}
+
+
+    @traced('optimizer.generate_combined_analysis')
+    def generate_combined_analysis(self, messages: List[Dict], include_summary: bool = True) -> Dict:
+        """Generates all visualizations (and optionally the summary) in a single completion.
+
+        The conversation is sent only once and the answer is constrained by a JSON
+        schema; sections missing from the answer or failing validation are
+        generated individually as a fallback.
+        """
+        sections = {
+            key: section for key, section in self.COMBINED_SECTIONS.items()
+            if include_summary or key != 'summary'
+        }
+
+        schema = "\n".join([f'  "{key}": {description}' for key, (description, _) in sections.items()])
+        system_message = f"""Analyze this conversation and return a single JSON object with exactly these keys:
+{{
+{schema}
+}}
+Return only valid JSON without explanations or code fences."""
+        response_format = {
+            'type': 'json_schema',
+            'json_schema': {
+                'name': 'combined_analysis',
+                'strict': True,
+                'schema': {
+                    'type': 'object',
+                    'properties': {key: json_schema for key, (_, json_schema) in sections.items()},
+                    'required': list(sections),
+                    'additionalProperties': False
+                }
+            }
+        }
+
+        context = self.context_cache.get(messages)
+
+        request_messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": f"Analyze this conversation:\n\n{context}"}
+        ]
+
+        parsed = {}
+        try:
+            response = requests.post(
+                self.completion_url,
+                json={
+                    "messages": request_messages,
+                    "temperature": 0.3,
+                    # Mindestens so viel wie die ersetzten Einzelaufrufe zusammen
+                    "max_tokens": self.SECTION_MAX_TOKENS * len(sections),
+                    "response_format": response_format
+                },
+                headers={"Content-Type": "application/json"}
+            )
+
+            if response.status_code == 200:
+                choice = response.json()["choices"][0]
+                parsed = self._parse_json_response(choice["message"]["content"])
+                if not parsed:
+                    # Abgeschnittenes oder ungültiges JSON: alle Abschnitte werden einzeln erzeugt
+                    print(f"Kombinierte Analyse nicht auswertbar (finish_reason={choice.get('finish_reason')}), "
+                          f"Fallback auf Einzelaufrufe")
+            else:
+                print(f"Kombinierte Analyse fehlgeschlagen (Status {response.status_code}), Fallback auf Einzelaufrufe")
+        except Exception as e:
+            print(f"Fehler bei der kombinierten Analyse: {str(e)}")
+
+        invalid = [key for key in sections if key in parsed and not self._valid_section(key, parsed[key])]
+        missing = [key for key in sections if key not in parsed or key in invalid]
+        if parsed and missing:
+            print(f"Kombinierte Analyse unvollständig oder ungültig, Fallback für: {', '.join(missing)}")
+
+        visualizations = {
+            'conversation_flow': self._combined_section(parsed, 'conversation_flow', 'mermaid')
+                or self.generate_conversation_flow(messages),
+            'knowledge_graph': self._combined_section(parsed, 'knowledge_graph', 'graphviz')
+                or self.generate_knowledge_graph(messages),
+            'topic_evolution': self._combined_section(parsed, 'topic_evolution', 'timeline')
+                or self.generate_topic_evolution(messages),
+            'sentiment_timeline': self._combined_section(parsed, 'sentiment_timeline', 'sentiment')
+                or self.generate_sentiment_timeline(messages)
+        }
+
+        result = {'visualizations': visualizations}
+        if include_summary:
+            summary = parsed.get('summary')
+            result['summary'] = summary if self._valid_section('summary', summary) else self.summarize_conversation(messages)
+        return result
+
+    @classmethod
+    def _combined_section(cls, parsed: Dict, key: str, section_type: str) -> Optional[Dict]:
+        """Validiert einen Abschnitt der kombinierten Analyse.
+
+        Strukturierte Abschnitte werden wie im Einzelmodus als JSON-Text geliefert.
+        """
+        value = parsed.get(key)
+        if not cls._valid_section(key, value):
+            return None
+        if not isinstance(value, str):
+            value = json.dumps(value, ensure_ascii=False, indent=2)
+        return {'type': section_type, 'content': value}
+
+    @staticmethod
+    def _valid_section(key: str, value) -> bool:
+        """Prüft einen Abschnitt gegen die Struktur aus COMBINED_SECTIONS"""
+        is_number = lambda x: isinstance(x, (int, float)) and not isinstance(x, bool)
+        is_index = lambda x: isinstance(x, int) and not isinstance(x, bool) and x >= 0
+        if key == 'topic_evolution':
+            return isinstance(value, list) and all(
+                isinstance(topic, dict)
+                and isinstance(topic.get('topic'), str) and topic['topic'].strip()
+                and is_index(topic.get('start')) and is_index(topic.get('end'))
+                and topic['start'] <= topic['end']
+                and is_number(topic.get('importance')) and 0 <= topic['importance'] <= 1
+                for topic in value
+            )
+        if key == 'sentiment_timeline':
+            return (
+                isinstance(value, dict)
+                and isinstance(value.get('trend'), str)
+                and isinstance(value.get('messages'), list)
+                and all(
+                    isinstance(entry, dict)
+                    and is_index(entry.get('index'))
+                    and isinstance(entry.get('role'), str)
+                    and is_number(entry.get('score')) and -1 <= entry['score'] <= 1
+                    for entry in value['messages']
+                )
+            )
+        return isinstance(value, str) and bool(value.strip())
+
+    @staticmethod
+    def _parse_json_response(text: str) -> Dict:
+        """Extrahiert ein JSON-Objekt aus einer Modellantwort (auch mit Code-Fences)"""
+        fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+        if fenced:
+            text = fenced.group(1)
+        start = text.find('{')
+        end = text.rfind('}')
+        if start == -1 or end <= start:
+            return {}
+        try:
+            data = json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            return {}
+        return data if isinstance(data, dict) else {}
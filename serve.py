@@ -0,0 +1,104 @@
+"""Produktionsstart mit Gunicorn.
+
+Die Anwendung wird einmal im Master-Prozess geladen (langdetect-Profile,
+PromptOptimizer) und danach in die Worker geforkt. Gestreamte Antworten
+laufen in Threads (gthread); bei SIGTERM werden laufende Streams bis
+WEB_GRACEFUL_TIMEOUT Sekunden zu Ende geführt.
+
+Aufruf: python serve.py
+"""
+import os
+import resource
+import time
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+
+load_dotenv()
+
+# Server-Konfiguration
+WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:5000')
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', '2'))
+WEB_THREADS = int(os.getenv('WEB_THREADS', '8'))
+WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '120'))
+
+START_TIME = time.monotonic()
+
+# Flask-SocketIO unterstützt keine mehreren Gunicorn-Worker (kein Sticky Routing, Emits
+# erreichen nur Clients des eigenen Workers); Job-Status dann nur per SSE oder Polling
+if WEB_WORKERS > 1:
+    os.environ['SOCKETIO_NOTIFICATIONS'] = 'false'
+
+
+def memory_usage() -> str:
+    """Beschreibt den aktuellen Speicherverbrauch des Prozesses.
+
+    USS (Private_Clean + Private_Dirty) zählt nur die Seiten, die ein Worker
+    allein belegt; mit dem Master geteilte Seiten aus dem Preload stecken nur im RSS.
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        kb = lambda key: int(fields[key].split()[0])
+        rss = kb('Rss') / 1024
+        uss = (kb('Private_Clean') + kb('Private_Dirty')) / 1024
+        return f"RSS {rss:.1f} MB, davon privat (USS) {uss:.1f} MB"
+    except (OSError, KeyError, ValueError):
+        # Ohne /proc nur der Spitzenwert verfügbar
+        return f"maximaler RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB"
+
+
+def when_ready(server):
+    if WEB_WORKERS > 1:
+        server.log.info("Socket.IO-Benachrichtigungen deaktiviert (WEB_WORKERS > 1); "
+                        "Job-Status über /api/jobs/<id>/events oder Polling abfragen")
+    server.log.info(
+        f"Anwendung geladen in {time.monotonic() - START_TIME:.2f}s, "
+        f"Master-Speicher: {memory_usage()}"
+    )
+
+
+def post_worker_init(worker):
+    # Wartende Analyse-Jobs erst im Worker aufnehmen, damit keine Threads vor dem Fork entstehen
+    import app
+    app.job_queue.resume_pending()
+    worker.log.info(f"Worker {worker.pid} bereit, Speicher: {memory_usage()}")
+
+
+def worker_exit(server, worker):
+    # Hintergrundjobs nicht über das Ende des Workers hinaus laufen lassen
+    import app
+    if app.precomputer:
+        app.precomputer.shutdown()
+    app.job_queue.shutdown()
+
+
+class ProductionServer(BaseApplication):
+    """Gunicorn-Anwendung mit vorab geladener Flask-App"""
+
+    def __init__(self, options=None):
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Läuft dank preload_app einmal im Master vor dem Forken
+        from app import create_app
+        return create_app()
+
+
+if __name__ == '__main__':
+    ProductionServer({
+        'bind': WEB_BIND,
+        'workers': WEB_WORKERS,
+        'worker_class': 'gthread',
+        'threads': WEB_THREADS,
+        'preload_app': True,
+        'graceful_timeout': WEB_GRACEFUL_TIMEOUT,
+        'when_ready': when_ready,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }).run()
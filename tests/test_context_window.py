@@ -0,0 +1,90 @@
+import pytest
+
+from context_window import ContextBudgetError, ContextWindow
+
+
+def conversation(turns, size=100):
+    messages = []
+    for turn in range(turns):
+        messages.append({'role': 'user', 'content': f'u{turn}'.ljust(size, '.')})
+        messages.append({'role': 'assistant', 'content': f'a{turn}'.ljust(size, '.')})
+    return messages
+
+
+def total_tokens(window, messages):
+    return sum(window.estimate_tokens(msg) for msg in messages)
+
+
+def test_history_within_budget_is_unchanged():
+    window = ContextWindow(budget=6000)
+    messages = conversation(3) + [{'role': 'user', 'content': 'frage'}]
+    assert window.fit(messages) == messages
+
+
+def test_budget_holds_and_prefix_is_stable_across_turns():
+    window = ContextWindow(budget=1000, chunk_size=8)
+    system = [{'role': 'system', 'content': 'Du bist ein Assistent.'}]
+    previous = None
+    prefix_changes = 0
+    for turns in range(1, 60):
+        history = conversation(turns)
+        messages = system + history + [{'role': 'user', 'content': 'neue frage'}]
+        fitted = window.fit(messages)
+
+        assert total_tokens(window, fitted) <= window.budget
+        assert fitted[0] == system[0]
+        assert fitted[-1] == messages[-1]
+        # Verworfen wird nur in ganzen Blöcken ab Gesprächsbeginn
+        start = history.index(fitted[1])
+        assert start % window.chunk_size == 0
+
+        if previous is not None and fitted[:len(previous) - 1] != previous[:-1]:
+            prefix_changes += 1
+        previous = fitted
+    # Der Präfix ändert sich nur, wenn ein Block fällt (alle vier Runden)
+    assert 0 < prefix_changes <= 59 // (window.chunk_size // 2) + 1
+
+
+def test_long_last_message_is_truncated_from_the_front():
+    window = ContextWindow(budget=200, chunk_size=4)
+    question = 'x' * 2000 + ' Was ist die Frage?'
+    messages = conversation(4) + [{'role': 'user', 'content': question}]
+    fitted = window.fit(messages)
+
+    assert len(fitted) == 1
+    assert total_tokens(window, fitted) <= window.budget
+    assert fitted[0]['content'].startswith('…')
+    assert fitted[0]['content'].endswith('Was ist die Frage?')
+
+
+def test_system_messages_over_budget_raise():
+    window = ContextWindow(budget=50)
+    messages = [{'role': 'system', 'content': 's' * 1000}, {'role': 'user', 'content': 'hallo'}]
+    with pytest.raises(ContextBudgetError):
+        window.fit(messages)
+
+
+def test_sent_contents_are_matched_by_position():
+    window = ContextWindow(budget=6000)
+    messages = [
+        {'role': 'user', 'content': 'weiter bitte'},
+        {'role': 'assistant', 'content': 'ok'},
+        {'role': 'user', 'content': 'weiter bitte'},
+        {'role': 'assistant', 'content': 'ok'},
+        {'role': 'user', 'content': 'OPT#2'}
+    ]
+    fitted = window.fit(messages, ['OPT#0', None, 'OPT#2'])
+    assert [msg['content'] for msg in fitted if msg['role'] == 'user'] == ['OPT#0', 'weiter bitte', 'OPT#2']
+    # Der Verlauf des Aufrufers bleibt unverändert
+    assert messages[0]['content'] == 'weiter bitte'
+
+
+def test_sent_contents_align_from_the_end_of_a_shortened_history():
+    window = ContextWindow(budget=6000)
+    messages = [
+        {'role': 'user', 'content': 'zweite'},
+        {'role': 'assistant', 'content': 'ok'},
+        {'role': 'user', 'content': 'dritte'}
+    ]
+    fitted = window.fit(messages, ['OPT#1', 'OPT#2', None])
+    assert [msg['content'] for msg in fitted if msg['role'] == 'user'] == ['OPT#2', 'dritte']
@@ -0,0 +1,54 @@
+from prompt_cache import SimilarPromptCache
+
+PROMPT = 'Please explain how photosynthesis works in plants and why it matters for the climate.'
+# Geschätzte Ähnlichkeit zu PROMPT: 0.875
+NEAR_PROMPT = 'Please explain how photosynthesis works in plants and why it matters for our climate.'
+
+
+def make_cache(**kwargs):
+    cache = SimilarPromptCache(**kwargs)
+    cache.add(PROMPT, 'en', 'en', 'optimized')
+    return cache
+
+
+def test_normalization_only_changes_case_whitespace_and_sentence_punctuation():
+    cache = SimilarPromptCache()
+    assert cache.lookup(PROMPT, 'en', 'en') is None
+    cache.add(PROMPT, 'en', 'en', 'optimized')
+    assert cache.lookup('  please explain how photosynthesis works in plants and why it matters for the climate ',
+                        'en', 'en') == 'optimized'
+    assert cache.normalize('Pi is 3.14.') == 'pi is 3.14'
+
+
+def test_similar_prompt_hits_above_threshold_and_misses_below():
+    assert make_cache(threshold=0.8).lookup(NEAR_PROMPT, 'en', 'en') == 'optimized'
+    assert make_cache(threshold=0.9).lookup(NEAR_PROMPT, 'en', 'en') is None
+
+
+def test_other_language_misses():
+    cache = make_cache(threshold=0.8)
+    assert cache.lookup(PROMPT, 'de', 'de') is None
+    assert cache.lookup(PROMPT, 'en', 'de') is None
+
+
+def test_numbers_and_operators_must_match():
+    cache = SimilarPromptCache(threshold=0.5)
+    cache.add('What is 12 + 7 in binary?', 'en', 'en', 'optimized')
+    assert cache.lookup('What is 12 + 8 in binary?', 'en', 'en') is None
+    assert cache.lookup('What is 12 - 7 in binary?', 'en', 'en') is None
+    assert cache.lookup('what is 12 + 7 in binary', 'en', 'en') == 'optimized'
+
+    cache.add('Round 3.5 to an integer.', 'en', 'en', 'rounded')
+    assert cache.lookup('Round 35 to an integer.', 'en', 'en') is None
+
+
+def test_audit_mode_counts_hits_without_serving_them():
+    cache = make_cache(audit=True)
+    assert cache.lookup(PROMPT, 'en', 'en') is None
+    stats = cache.get_stats()
+    assert stats['audit_hits'] == 1
+    assert stats['hits'] == 0
+
+    # Der Audit-Modus lässt sich je Aufruf überschreiben
+    assert cache.lookup(PROMPT, 'en', 'en', audit=False) == 'optimized'
+    assert cache.get_stats()['hits'] == 1